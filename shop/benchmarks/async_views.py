@@ -0,0 +1,71 @@
+"""
+Compare the sync DRF catalog views with their async counterparts under ASGI.
+
+Requests are driven in-process through Django's AsyncClient, which runs the
+full ASGI request path: async views stay on the event loop, sync views are
+pushed through the sync_to_async thread hop. Note that the sync product
+detail view serves its rendered-JSON cache, the async one does not.
+
+    cd shop && python -m benchmarks.async_views --products 10000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from .common import seed_catalog, setup_django, summarize
+
+
+async def drive(client, path, total, concurrency):
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(path)
+
+    async def worker():
+        while not queue.empty():
+            url = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, (url, response.status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def main(args):
+    from django.test import AsyncClient
+    from product.models import Product
+
+    client = AsyncClient()
+    pk = await Product.objects.values_list('pk', flat=True).afirst()
+    routes = {
+        'product_list': ('/api/product/', '/api/async/product/'),
+        'product_detail': (f'/api/product/{pk}', f'/api/async/product/{pk}'),
+        'category_list': ('/api/category/', '/api/async/category/'),
+    }
+    results = {}
+    for name, (sync_path, async_path) in routes.items():
+        # Warm up both variants before measuring.
+        await drive(client, sync_path, args.concurrency, args.concurrency)
+        await drive(client, async_path, args.concurrency, args.concurrency)
+        results[name] = {
+            'sync': await drive(client, sync_path, args.requests, args.concurrency),
+            'async': await drive(client, async_path, args.requests, args.concurrency),
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--db', help='Reuse this SQLite file instead of a fresh temporary one')
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    seed_catalog(args.products)
+    print(json.dumps(asyncio.run(main(args)), indent=2))
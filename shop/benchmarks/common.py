@@ -0,0 +1,124 @@
+"""Shared helpers for the standalone benchmark scripts in this package."""
+import os
+import statistics
+import tempfile
+
+
+def setup_django(db_path=None):
+    """
+    Configure Django against a throwaway SQLite file and migrate it.
+
+    Must run before any model import. Returns the database path.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('DEBUG', 'False')
+
+    import django
+    from django.conf import settings
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='shop-bench-'), 'bench.sqlite3')
+    django.setup()
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.ALLOWED_HOSTS = ['*']
+    # Uploads made by the benchmarks go next to the database, not into the project.
+    settings.MEDIA_ROOT = os.path.join(os.path.dirname(db_path), 'media')
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def seed_catalog(products, images_per_product=1, categories=20, option_groups=3, values_per_group=5,
+                 variants_per_product=4, batch_size=5000, progress=None):
+    """
+    Bulk-insert products, with images, category links, attribute values and
+    variants, until the catalog holds `products` products.
+
+    Seeding is incremental, so one database can be grown from 10k to 1M
+    products between runs. Categories form two levels (a quarter of them are
+    roots) and every product gets one value from each option group. Products
+    vary along the first option group and a "Variant" group none of them
+    carries a value of, giving `variants_per_product` variants each.
+    `progress(count)` is called after each batch.
+    """
+    from product.models import (FACET_INDEX_CACHE_KEY, CacheVersion, Category, OptionGroup, OptionValue, Product,
+                                ProductAttributeValue, ProductImage, ProductOptionGroup)
+    from product.variants import sync_variants
+
+    existing = Product.objects.count()
+    if existing >= products:
+        return
+    category_ids = list(Category.objects.order_by('pk').values_list('pk', flat=True))
+    if not category_ids:
+        roots = [Category.objects.create(title=f'Category {i}') for i in range(max(1, categories // 4))]
+        children = [
+            Category.objects.create(title=f'Category {i}', parent=roots[i % len(roots)])
+            for i in range(len(roots), categories)
+        ]
+        category_ids = [category.pk for category in roots + children]
+    value_ids, group_ids = [], []
+    for g in range(option_groups):
+        group, _ = OptionGroup.objects.get_or_create(title=f'Group {g}')
+        group_ids.append(group.pk)
+        value_ids.append([
+            OptionValue.objects.get_or_create(value=f'Value {g}-{v}', option_group=group)[0].pk
+            for v in range(values_per_group)
+        ])
+    variant_group_ids = []
+    if variants_per_product and option_groups:
+        group, _ = OptionGroup.objects.get_or_create(title='Variant')
+        for v in range(variants_per_product):
+            OptionValue.objects.get_or_create(value=f'Variant {v}', option_group=group)
+        variant_group_ids = [group_ids[0], group.pk]
+
+    Through = Product.category.through
+    for start in range(existing, products, batch_size):
+        created = Product.objects.bulk_create(
+            Product(title=f'Product {i}', slug=f'product-{i}', price=10, final_price_value=10,
+                    description=f'Description of product {i}')
+            for i in range(start, min(start + batch_size, products))
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(product=product, image=f'products/{product.pk}/images/{index}.jpg', index=index)
+            for product in created
+            for index in range(images_per_product)
+        )
+        Through.objects.bulk_create(
+            Through(product_id=product.pk, category_id=category_ids[product.pk % len(category_ids)])
+            for product in created
+        )
+        ProductAttributeValue.objects.bulk_create(
+            ProductAttributeValue(product_id=product.pk, option_value_id=values[product.pk % len(values)])
+            for product in created
+            for values in value_ids
+        )
+        ProductOptionGroup.objects.bulk_create(
+            ProductOptionGroup(product_id=product.pk, option_group_id=group_id)
+            for product in created
+            for group_id in variant_group_ids
+        )
+        if variant_group_ids:
+            sync_variants([product.pk for product in created])
+        if progress:
+            progress(start + len(created))
+    # bulk_create() sends no signals; make running facet indexes rebuild.
+    CacheVersion.bump(FACET_INDEX_CACHE_KEY)
+
+
+def summarize(latencies, elapsed):
+    """Throughput and latency percentiles (in milliseconds) of a run."""
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000
+
+    return {
+        'requests': len(ordered),
+        'throughput_rps': round(len(ordered) / elapsed, 1),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 2),
+        'p50_ms': round(percentile(50), 2),
+        'p95_ms': round(percentile(95), 2),
+        'p99_ms': round(percentile(99), 2),
+    }
@@ -0,0 +1,224 @@
+"""
+Load benchmark of every catalog route against seeded catalogs.
+
+For each of `--sizes` the catalog is grown to that many products (seeding is
+incremental, so give the sizes in increasing order) and every route of
+product/urls.py and its router is driven in-process, through the full
+Django request stack, by `--concurrency` threads. Each route reports its
+throughput, latency percentiles (ms), error count and the SQL queries of
+one warmed-up request. Write routes run after the reads, one at a time.
+
+    cd shop && python -m benchmarks.endpoints --sizes 10000 100000 1000000 --output bench.json
+    cd shop && python -m benchmarks.endpoints --sizes 10000 --baseline bench.json
+
+With --baseline, routes whose p95 latency or throughput got more than
+--tolerance percent worse, or that issue more queries than before, are
+listed under "regressions" and the exit status is 1.
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from .common import seed_catalog, setup_django, summarize
+
+
+# `share` scales --requests for routes too slow to repeat as often as the rest.
+Route = namedtuple('Route', 'name method path data format user share write', defaults=(None, None, None, 1, False))
+
+
+def png_upload():
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), (200, 30, 30)).save(buffer, 'PNG')
+    return SimpleUploadedFile('bench.png', buffer.getvalue(), content_type='image/png')
+
+
+def build_routes():
+    from django.contrib.auth import get_user_model
+    from django.urls import reverse
+
+    from product.models import Category, OptionGroup, OptionValue, Product, ProductImage
+    from product.reservations import reserve
+
+    User = get_user_model()
+    staff = User.objects.filter(username='bench-staff').first() or User.objects.create_user(
+        username='bench-staff', password='bench', phone_number='+989120000001', is_staff=True
+    )
+    count = Product.objects.count()
+    product = Product.objects.order_by('pk').values_list('pk', flat=True)[count // 2]
+    image = ProductImage.objects.filter(product=product).values_list('pk', flat=True).first()
+    # Enough stock that every reservation request succeeds; one reservation is kept for the detail route.
+    Product.objects.filter(pk=product).update(stock=1_000_000)
+    reservation = reserve([(product, 1)], user=staff)
+    category = Category.objects.filter(parent__isnull=True).order_by('pk').first()
+    group = OptionGroup.objects.order_by('pk').first()
+    options = ','.join(
+        str(OptionValue.objects.filter(option_group=group).order_by('pk').values_list('pk', flat=True).first())
+        for group in OptionGroup.objects.order_by('pk')[:2]
+    )
+
+    product_list = reverse('product_list')
+    return [
+        Route('product_list', 'get', product_list),
+        Route('product_list_deep_offset', 'get', f'{product_list}?offset={max(0, count - 30)}'),
+        Route('product_list_cursor', 'get', f'{product_list}?pagination=cursor'),
+        Route('product_list_category', 'get', f'{product_list}?category={category.slug}&include_descendants=1'),
+        Route('product_list_options', 'get', f'{product_list}?options={options}&facets=1'),
+        Route('product_search', 'get', f"{reverse('product_search')}?q=product"),
+        Route('product_detail', 'get', reverse('product_detail', args=[product])),
+        Route('product_image_detail', 'get', reverse('product_image', args=[image])),
+        Route('product_variants', 'get', reverse('product_variants', args=[product])),
+        Route('product_export', 'get', reverse('product_export'), user=staff, share=0.01),
+        Route('category_list', 'get', reverse('category-list')),
+        Route('category_detail', 'get', reverse('category-detail', args=[category.pk])),
+        Route('category_tree', 'get', reverse('category-tree')),
+        Route('option_group_list', 'get', reverse('optiongroup-list')),
+        Route('option_group_detail', 'get', reverse('optiongroup-detail', args=[group.pk])),
+        Route('option_attribute_list', 'get', reverse('option-attribute-list')),
+        Route('option_attribute_detail', 'get', reverse('option-attribute-detail', args=[group.pk])),
+        Route('reservation_detail', 'get', reverse('reservation_detail', args=[reservation.pk]), user=staff),
+        Route('async_product_list', 'get', reverse('async_product_list')),
+        Route('async_product_detail', 'get', reverse('async_product_detail', args=[product])),
+        Route('async_category_list', 'get', reverse('async_category_list')),
+        Route('product_reprice', 'post', reverse('product_reprice'), {'ids': [product], 'price_discount': '10'},
+              'json', staff, share=0.1, write=True),
+        Route('product_image_upload', 'post', reverse('product_image'),
+              lambda: {'product': product, 'image': png_upload()}, 'multipart', share=0.1, write=True),
+        Route('reservation_create', 'post', reverse('reservation_create'),
+              {'items': [{'product': product, 'quantity': 1}]}, 'json', staff, share=0.1, write=True),
+    ]
+
+
+def send(client, route):
+    data = route.data() if callable(route.data) else route.data
+    if route.method == 'get':
+        response = client.get(route.path, data)
+    else:
+        response = getattr(client, route.method)(route.path, data, format=route.format)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response.status_code
+
+
+def make_client(route):
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    if route.user is not None:
+        client.force_authenticate(route.user)
+    return client
+
+
+def count_queries(route):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as queries:
+        send(make_client(route), route)
+    return len(queries)
+
+
+def drive(route, total, concurrency):
+    from django.db import connections
+
+    latencies = []
+    errors = []
+    counter = itertools.count()
+
+    def worker():
+        client = make_client(route)
+        try:
+            while next(counter) < total:
+                started = time.perf_counter()
+                status = send(client, route)
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors.append(status)
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    result = summarize(latencies, time.perf_counter() - started)
+    result['errors'] = len(errors)
+    return result
+
+
+def run_size(args):
+    results = {}
+    for route in build_routes():
+        concurrency = 1 if route.write else args.concurrency
+        total = max(1, int(args.requests * route.share))
+        # Warm up caches (facet index, category tree, detail JSON) first.
+        drive(route, min(total, concurrency), concurrency)
+        queries = count_queries(route)
+        results[route.name] = drive(route, total, concurrency)
+        results[route.name]['queries_per_request'] = queries
+        print(f'  {route.name}: {results[route.name]}', file=sys.stderr)
+    return results
+
+
+def find_regressions(results, baseline, tolerance):
+    """Compare two reports; returns one entry per worse metric of a route present in both."""
+    regressions = []
+    for size, routes in results['sizes'].items():
+        for name, current in routes.items():
+            previous = baseline.get('sizes', {}).get(size, {}).get(name)
+            if previous is None:
+                continue
+            checks = (
+                ('p95_ms', current['p95_ms'] > previous['p95_ms'] * (1 + tolerance / 100)),
+                ('throughput_rps', current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance / 100)),
+                ('queries_per_request', current['queries_per_request'] > previous['queries_per_request']),
+            )
+            for metric, worse in checks:
+                if worse:
+                    regressions.append({
+                        'size': size, 'route': name, 'metric': metric,
+                        'baseline': previous[metric], 'current': current[metric],
+                    })
+    return regressions
+
+
+def main(args):
+    setup_django(args.db)
+    results = {'meta': {
+        'requests': args.requests, 'concurrency': args.concurrency, 'python': sys.version.split()[0],
+    }, 'sizes': {}}
+    for size in sorted(args.sizes):
+        print(f'Seeding {size} products', file=sys.stderr)
+        seed_catalog(size, progress=lambda count: print(f'  {count}', file=sys.stderr))
+        results['sizes'][str(size)] = run_size(args)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as stream:
+            results['regressions'] = find_regressions(results, json.load(stream), args.tolerance)
+        status = 1 if results['regressions'] else 0
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as stream:
+            stream.write(output + '\n')
+    print(output)
+    return status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--db', help='Reuse (and grow) this SQLite file instead of a fresh temporary one')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    parser.add_argument('--baseline', help='Report to compare against')
+    parser.add_argument('--tolerance', type=float, default=10, help='Allowed slowdown in percent')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+"""
+DRF's JSONRenderer/JSONParser versus the orjson-backed FastJSONRenderer/FastJSONParser.
+
+Payloads hold `--items` products: the product card and detail formats
+(decimals already strings) and raw `values()` rows, where every Decimal and
+datetime goes through the encoder. Times are the best of `--repeat` runs,
+in milliseconds per payload; rendered bytes are checked to be identical.
+
+    cd shop && python -m benchmarks.json_renderer --items 1000
+"""
+import argparse
+import json
+import time
+from io import BytesIO
+
+from .common import seed_catalog, setup_django
+
+
+def best_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) * 1000, 3)
+
+
+def main(args):
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIRequestFactory
+
+    from config.parsers import FastJSONParser
+    from config.renderers import FastJSONRenderer
+    from product.fast_serializers import product_card_serializer, serialize_product_cards, serialize_product_detail
+    from product.models import Product
+
+    request = APIRequestFactory().get('/api/product/')
+    rows = Product.objects.values(*product_card_serializer.columns)[:args.items]
+    pks = list(Product.objects.values_list('pk', flat=True)[:args.items])
+    payloads = {
+        'product_cards': {'count': len(pks), 'results': serialize_product_cards(rows)},
+        'product_details': [serialize_product_detail(pk, request) for pk in pks],
+        'values_rows': list(Product.objects.values()[:args.items]),
+    }
+
+    results = {}
+    for name, data in payloads.items():
+        rendered = JSONRenderer().render(data)
+        assert FastJSONRenderer().render(data) == rendered, name
+        render = {
+            'drf_ms': best_ms(lambda: JSONRenderer().render(data), args.repeat),
+            'fast_ms': best_ms(lambda: FastJSONRenderer().render(data), args.repeat),
+        }
+        parse = {
+            'drf_ms': best_ms(lambda: JSONParser().parse(BytesIO(rendered)), args.repeat),
+            'fast_ms': best_ms(lambda: FastJSONParser().parse(BytesIO(rendered)), args.repeat),
+        }
+        for timing in (render, parse):
+            timing['speedup'] = round(timing['drf_ms'] / timing['fast_ms'], 1)
+        results[name] = {'bytes': len(rendered), 'render': render, 'parse': parse}
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--db', help='Reuse this SQLite file instead of a fresh temporary one')
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    seed_catalog(args.items)
+    print(json.dumps(main(args), indent=2))
@@ -0,0 +1,77 @@
+"""
+Throughput of stock reservations with many threads hammering one hot product.
+
+Each thread keeps reserving carts (the hot product plus, with --cart-size
+above 1, other products) until the hot product is sold out. The run fails
+if more units were reserved than were in stock.
+
+    cd shop && python -m benchmarks.reservations --threads 32 --stock 2000
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import setup_django
+
+
+def main(args):
+    from django.db import connection
+
+    from product.models import Product, ReservationItem
+    from product.reservations import OutOfStock, reserve
+
+    hot = Product.objects.create(title='Hot product', stock=args.stock)
+    others = [Product.objects.create(title=f'Side product {i}', stock=args.stock * args.threads).pk
+              for i in range(args.cart_size - 1)]
+    latencies = []
+
+    def buyer(index):
+        reserved = 0
+        try:
+            while True:
+                cart = [(hot.pk, 1)] + [(pk, 1) for pk in others]
+                started = time.perf_counter()
+                try:
+                    reserve(cart)
+                except OutOfStock:
+                    return reserved
+                finally:
+                    latencies.append(time.perf_counter() - started)
+                reserved += 1
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        reserved = sum(pool.map(buyer, range(args.threads)))
+    elapsed = time.perf_counter() - started
+
+    hot.refresh_from_db()
+    sold = sum(ReservationItem.objects.filter(product=hot).values_list('quantity', flat=True))
+    latencies.sort()
+    result = {
+        'threads': args.threads,
+        'stock': args.stock,
+        'cart_size': args.cart_size,
+        'reserved': reserved,
+        'remaining_stock': hot.stock,
+        'oversold': sold > args.stock,
+        'reservations_per_second': round(reserved / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+    }
+    assert reserved == sold == args.stock and hot.stock == 0, result
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--stock', type=int, default=2000)
+    parser.add_argument('--cart-size', type=int, default=1)
+    parser.add_argument('--db', help='Use this SQLite file instead of a fresh temporary one')
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    print(json.dumps(main(args), indent=2))
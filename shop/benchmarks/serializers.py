@@ -0,0 +1,105 @@
+"""
+Per-item cost of the DRF product serializers versus the precompiled fast path.
+
+`serialize` times the representation step alone over rows that are already
+loaded; `end_to_end` includes the queries (prefetching for DRF, `values()`
+for the fast path). Times are the best of `--repeat` runs, in microseconds
+per product.
+
+    cd shop && python -m benchmarks.serializers --products 1000
+"""
+import argparse
+import json
+import time
+
+from .common import seed_catalog, setup_django
+
+
+def best_per_item(func, items, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) / items * 1e6, 2)
+
+
+def compare(drf, fast, items, repeat):
+    drf_us, fast_us = best_per_item(drf, items, repeat), best_per_item(fast, items, repeat)
+    return {'drf_us': drf_us, 'fast_us': fast_us, 'speedup': round(drf_us / fast_us, 1)}
+
+
+def load_detail_rows(pks):
+    """values() rows with the images and category titles the detail handlers read."""
+    from product.fast_serializers import product_detail_serializer, product_image_serializer
+    from product.models import Category, Product, ProductImage
+
+    rows = list(Product.objects.filter(pk__in=pks).values(*product_detail_serializer.columns))
+    for row in rows:
+        row['images'] = list(ProductImage.objects.filter(product=row['id']).values(*product_image_serializer.columns))
+        row['categories'] = list(Category.objects.filter(products=row['id']).values_list('title', flat=True))
+    return rows
+
+
+def main(args):
+    from rest_framework.test import APIRequestFactory
+
+    from product.fast_serializers import (product_card_serializer, product_detail_serializer,
+                                          serialize_product_cards, serialize_product_detail)
+    from product.models import Product
+    from product.serializer import ProductDetailSerializer, ProductListSerializer
+    from product.views import ProductDetailView, ProductListView
+
+    count = args.products
+    request = APIRequestFactory().get('/api/product/')
+    cards = ProductListView.queryset.all()[:count]
+    card_values = Product.objects.values(*product_card_serializer.columns)[:count]
+
+    card_objects = list(cards)
+    card_rows = list(card_values)
+    serialize_product_cards(card_rows)  # attaches the represented main images to the rows
+    pks = [product.pk for product in card_objects]
+    detail_objects = list(ProductDetailView.queryset.filter(pk__in=pks))
+    detail_rows = load_detail_rows(pks)
+
+    def drf_detail(products):
+        return [ProductDetailSerializer(product, context={'request': request}).data for product in products]
+
+    return {
+        'product_card': {
+            'serialize': compare(
+                lambda: ProductListSerializer(card_objects, many=True).data,
+                lambda: product_card_serializer.serialize(card_rows),
+                count, args.repeat,
+            ),
+            'end_to_end': compare(
+                lambda: ProductListSerializer(list(cards), many=True).data,
+                lambda: serialize_product_cards(card_values.all()),
+                count, args.repeat,
+            ),
+        },
+        'product_detail': {
+            'serialize': compare(
+                lambda: drf_detail(detail_objects),
+                lambda: product_detail_serializer.serialize(detail_rows, request),
+                count, args.repeat,
+            ),
+            'end_to_end': compare(
+                lambda: drf_detail(ProductDetailView.queryset.get(pk=pk) for pk in pks),
+                lambda: [serialize_product_detail(pk, request) for pk in pks],
+                count, args.repeat,
+            ),
+        },
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', help='Reuse this SQLite file instead of a fresh temporary one')
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    seed_catalog(args.products)
+    print(json.dumps(main(args), indent=2))
@@ -0,0 +1,122 @@
+"""
+Mixed read/write throughput of each SQLITE_PROFILE under concurrent load.
+
+Every profile runs in its own process against its own freshly seeded
+database, `--threads` threads each with their own connection, for
+`--seconds`. A `--write-ratio` share of the operations are write
+transactions in the usual Django shape: read the product, then update it
+(and bump its stock). The rest read a catalog page and one product. Errors
+such as "database is locked" are counted, not retried.
+
+    cd shop && python -m benchmarks.sqlite_profile --threads 16 --seconds 10 --write-ratio 0.2
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import seed_catalog, setup_django, summarize
+
+
+PROFILES = ('default', 'production')
+
+
+def run_profile(args):
+    """Body of the per-profile child process; SQLITE_PROFILE is set in its environment."""
+    setup_django()
+    from django.db import OperationalError, connection, transaction
+    from django.db.models import F
+    from django.utils import timezone
+
+    from product.models import Product
+
+    seed_catalog(args.products)
+    product_ids = list(Product.objects.values_list('pk', flat=True))
+    connection.close()
+
+    def read():
+        list(Product.objects.filter(is_active=True).order_by('-created_at').values('id', 'title', 'price')[:20])
+        Product.objects.filter(pk=random.choice(product_ids)).values('id', 'title', 'stock').get()
+
+    def write():
+        with transaction.atomic():
+            product = Product.objects.get(pk=random.choice(product_ids))
+            Product.objects.filter(pk=product.pk).update(stock=F('stock') + 1, updated_at=timezone.now())
+
+    def worker(seed):
+        rng = random.Random(seed)
+        latencies = {'read': [], 'write': []}
+        errors = {'read': 0, 'write': 0}
+        deadline = time.perf_counter() + args.seconds
+        try:
+            while time.perf_counter() < deadline:
+                kind = 'write' if rng.random() < args.write_ratio else 'read'
+                started = time.perf_counter()
+                try:
+                    (write if kind == 'write' else read)()
+                except OperationalError:
+                    errors[kind] += 1
+                    continue
+                latencies[kind].append(time.perf_counter() - started)
+        finally:
+            connection.close()
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(worker, range(args.threads)))
+    elapsed = time.perf_counter() - started
+
+    report = {}
+    for kind in ('read', 'write'):
+        latencies = [latency for result in results for latency in result[0][kind]]
+        report[kind] = summarize(latencies, elapsed) if latencies else {'requests': 0, 'throughput_rps': 0}
+        report[kind]['errors'] = sum(result[1][kind] for result in results)
+    report['total_rps'] = round(report['read']['throughput_rps'] + report['write']['throughput_rps'], 1)
+    return report
+
+
+def main(args):
+    reports = {}
+    for profile in args.profiles:
+        command = [
+            sys.executable, '-m', 'benchmarks.sqlite_profile', '--run-profile',
+            '--threads', str(args.threads), '--seconds', str(args.seconds),
+            '--write-ratio', str(args.write_ratio), '--products', str(args.products),
+        ]
+        output = subprocess.run(
+            command, env={**os.environ, 'SQLITE_PROFILE': profile}, check=True, capture_output=True, text=True,
+        ).stdout
+        reports[profile] = json.loads(output)
+    result = {
+        'threads': args.threads,
+        'seconds': args.seconds,
+        'write_ratio': args.write_ratio,
+        'products': args.products,
+        'profiles': reports,
+    }
+    if 'default' in reports and 'production' in reports and reports['default']['total_rps']:
+        result['production_speedup'] = round(
+            reports['production']['total_rps'] / reports['default']['total_rps'], 2
+        )
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+    parser.add_argument('--run-profile', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        print(json.dumps(run_profile(args)))
+    else:
+        print(json.dumps(main(args), indent=2))
@@ -0,0 +1,137 @@
+"""
+Read/write splitting between the primary database and read replicas.
+
+Safe-method requests (GET, HEAD, OPTIONS) served by the apps listed in
+REPLICA_APPS read from one of READ_REPLICAS, picked at random per request.
+Everything else goes to the primary (`default`): writes, reads inside a
+transaction, reads made after the request wrote, and all work outside
+requests (jobs, management commands).
+
+A client that wrote gets a `db_pin` cookie for REPLICA_PIN_SECONDS, and
+while it has one its reads are served by the primary too, so it sees its
+own writes even when the replicas lag behind.
+
+Locally, replicas are plain SQLite files listed in DATABASE_REPLICAS,
+refreshed from the primary with `manage.py refresh_read_replicas`.
+"""
+import random
+import sqlite3
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+PIN_COOKIE = 'db_pin'
+
+
+class RoutingState:
+    """Where the reads of the current request go, and whether it wrote."""
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+# Holds a mutable object: threads the request hands work to get a copy of the context but
+# the same state, so their writes pin the rest of the request as well.
+_state = ContextVar('db_routing_state', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+            state.replica = None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the same rows.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema along with their data from the primary.
+        return False if db in settings.READ_REPLICAS else None
+
+
+class ReplicaRoutingMiddleware:
+    """Route the reads of safe catalog requests to a replica and pin writers to the primary."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django runs a sync process_view through a thread; this one never blocks.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(state, response)
+
+    async def __acall__(self, request):
+        # Views run by sync_to_async get a copy of this context, holding the same state.
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(state, response)
+
+    def pin(self, state, response):
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.route(request, view_func)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.route(request, view_func)
+
+    def route(self, request, view_func):
+        state = _state.get()
+        if (
+            state is not None
+            and settings.READ_REPLICAS
+            and request.method in SAFE_METHODS
+            and PIN_COOKIE not in request.COOKIES
+            and view_func.__module__.partition('.')[0] in settings.REPLICA_APPS
+        ):
+            state.replica = random.choice(settings.READ_REPLICAS)
+
+
+def refresh_replicas(aliases=None):
+    """Copy the primary SQLite database into each replica file with SQLite's online backup."""
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    aliases = settings.READ_REPLICAS if aliases is None else aliases
+    for alias in aliases:
+        connections[alias].close()
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            source.connection.backup(target)
+        finally:
+            target.close()
+    return aliases
@@ -0,0 +1,240 @@
+"""
+Prometheus metrics shared by all worker processes.
+
+Every thread of every process writes its metric values into its own
+memory-mapped file under METRICS_ROOT, so recording a value takes no lock:
+each file has exactly one writer. A file is a sequence of entries
+(key length, key, padding, float64 value) after an 8-byte header holding
+the number of bytes in use, which is only advanced once an entry is fully
+written. The /metrics view reads every file in the directory and sums the
+values per series, whichever process serves the scrape.
+
+Files of exited processes keep contributing their totals, so counters
+survive worker restarts; clear METRICS_ROOT when deploying to reset them.
+"""
+import bisect
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+
+HEADER = struct.Struct('<Q')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+
+# Separates the metric name, label values and histogram parts in a key.
+SEP = '\x1f'
+
+
+class MetricsFile:
+    """The memory-mapped values written by one thread of one process."""
+
+    initial_size = 64 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.file.truncate(self.initial_size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.used = HEADER.unpack_from(self.map, 0)[0] or HEADER.size
+        self.offsets = {}
+        self.values = {}
+        for key, offset, value in read_entries(self.map, self.used):
+            self.offsets[key] = offset
+            self.values[key] = value
+
+    def add(self, key, amount):
+        offset = self.offsets.get(key)
+        if offset is None:
+            offset = self.append(key)
+        value = self.values[key] + amount
+        self.values[key] = value
+        VALUE.pack_into(self.map, offset, value)
+
+    def append(self, key):
+        encoded = key.encode()
+        padding = -(KEY_LENGTH.size + len(encoded)) % 8
+        size = KEY_LENGTH.size + len(encoded) + padding + VALUE.size
+        while self.used + size > len(self.map):
+            self.map.resize(len(self.map) * 2)
+        start = self.used
+        KEY_LENGTH.pack_into(self.map, start, len(encoded))
+        self.map[start + KEY_LENGTH.size:start + KEY_LENGTH.size + len(encoded)] = encoded
+        offset = start + size - VALUE.size
+        VALUE.pack_into(self.map, offset, 0.0)
+        self.used += size
+        # Publish the entry to readers only once it is complete.
+        HEADER.pack_into(self.map, 0, self.used)
+        self.offsets[key] = offset
+        self.values[key] = 0.0
+        return offset
+
+
+def read_entries(data, used=None):
+    """Yield (key, value offset, value) for each complete entry of a metrics file's contents."""
+    if used is None:
+        used = HEADER.unpack_from(data, 0)[0] if len(data) >= HEADER.size else 0
+    position = HEADER.size
+    while position < used:
+        length = KEY_LENGTH.unpack_from(data, position)[0]
+        key_start = position + KEY_LENGTH.size
+        key = bytes(data[key_start:key_start + length]).decode()
+        offset = key_start + length + (-(KEY_LENGTH.size + length) % 8)
+        yield key, offset, VALUE.unpack_from(data, offset)[0]
+        position = offset + VALUE.size
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.local = threading.local()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def file(self):
+        current = getattr(self.local, 'file', None)
+        root = settings.METRICS_ROOT
+        # A forked worker inherits the parent's thread-local file; give it its own.
+        if current is None or current.pid != os.getpid() or current.root != root:
+            os.makedirs(root, exist_ok=True)
+            current = MetricsFile(os.path.join(root, f'{os.getpid()}-{threading.get_ident()}.metrics'))
+            current.pid, current.root = os.getpid(), root
+            self.local.file = current
+        return current
+
+    def add(self, key, amount):
+        self.file().add(key, amount)
+
+    def collect(self):
+        """Sum every series over the metrics files of all processes and threads."""
+        totals = {}
+        root = settings.METRICS_ROOT
+        try:
+            names = os.listdir(root)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            if not name.endswith('.metrics'):
+                continue
+            with open(os.path.join(root, name), 'rb') as stream:
+                data = stream.read()
+            for key, _, value in read_entries(data):
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def render(self):
+        """The Prometheus text exposition of all registered metrics."""
+        series = {}
+        for key, value in self.collect().items():
+            name, *rest = key.split(SEP)
+            series.setdefault(name, []).append((rest, value))
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            lines.extend(metric.expose(series.get(name, [])))
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    return repr(int(value)) if value == int(value) else repr(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def inc(self, *values, amount=1):
+        registry.add(SEP.join((self.name,) + values), amount)
+
+    def expose(self, series):
+        for values, total in sorted(series):
+            yield f'{self.name}{format_labels(self.labels, values)} {format_value(total)}'
+
+
+class Histogram:
+    type = 'histogram'
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, labels=(), buckets=default_buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *values, amount):
+        # Only the bucket the value falls into is counted; render() makes them cumulative.
+        prefix = SEP.join((self.name,) + values)
+        index = bisect.bisect_left(self.buckets, amount)
+        registry.add(f'{prefix}{SEP}bucket{SEP}{index}', 1)
+        registry.add(f'{prefix}{SEP}sum', amount)
+        registry.add(f'{prefix}{SEP}count', 1)
+
+    def expose(self, series):
+        groups = {}
+        for parts, total in series:
+            values, part = tuple(parts[:len(self.labels)]), parts[len(self.labels):]
+            groups.setdefault(values, {})[tuple(part)] = total
+        for values, parts in sorted(groups.items()):
+            cumulative = 0
+            for index, bound in enumerate(self.buckets + (float('inf'),)):
+                cumulative += parts.get(('bucket', str(index)), 0)
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f'{self.name}_bucket{format_labels(self.labels, values, [("le", le)])} {format_value(cumulative)}'
+            yield f'{self.name}_sum{format_labels(self.labels, values)} {format_value(parts.get(("sum",), 0))}'
+            yield f'{self.name}_count{format_labels(self.labels, values)} {format_value(parts.get(("count",), 0))}'
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.register(Counter(
+    'http_requests_total', 'HTTP requests by route, method and status class.', ('route', 'method', 'status')
+))
+REQUEST_DURATION = registry.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route and method.', ('route', 'method')
+))
+DB_QUERIES = registry.register(Counter(
+    'db_queries_total', 'SQL queries run while serving requests, by route.', ('route',)
+))
+DB_DURATION = registry.register(Counter(
+    'db_query_duration_seconds_total', 'Time spent in SQL queries while serving requests, by route.', ('route',)
+))
+
+
+def record_request(route, method, status, seconds, queries=None, db_seconds=None):
+    REQUESTS.inc(route, method, f'{status // 100}xx')
+    REQUEST_DURATION.observe(route, method, amount=seconds)
+    if queries is not None:
+        DB_QUERIES.inc(route, amount=queries)
+        DB_DURATION.inc(route, amount=db_seconds)
+
+
+def metrics_view(request):
+    """GET /metrics - Prometheus scrape endpoint; requires `Authorization: Bearer <METRICS_TOKEN>` when set."""
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
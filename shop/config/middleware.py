@@ -0,0 +1,251 @@
+"""
+Project-wide middleware: metrics, per-request SQL instrumentation and on-demand profiling.
+
+Every query of a request is timed through a database execute wrapper, which
+works with DEBUG off and costs one Python call and two clock reads per
+query. Each response gets a `Server-Timing` header with the query count and
+database time. Each request is logged to the `config.sql` logger with its
+totals, slowest statements and most repeated statement (the usual sign of
+an N+1), and when a request crosses SQL_LOG_MAX_QUERIES or
+SQL_LOG_MAX_DB_MS the full query list is logged as a warning.
+
+Log records carry the measurements in a `sql` attribute for structured
+formatters; the message itself is logfmt. For streaming responses only the
+queries made before the body starts streaming are counted.
+
+The middleware here support both WSGI and ASGI: under ASGI they run as
+coroutines instead of forcing Django to switch threads around them.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from collections import Counter
+from concurrent.futures import Executor, Future
+from contextlib import ExitStack
+
+from asgiref.sync import AsyncToSync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import record_request
+from .profiling import requested_mode, run_profiled, staff_user
+
+
+logger = logging.getLogger('config.sql')
+
+
+class QueryRecorder:
+    """Execute wrapper collecting (sql, milliseconds, alias) for every query."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - started) * 1000, context['connection'].alias))
+
+    @property
+    def db_ms(self):
+        return sum(duration for _, duration, _ in self.queries)
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, status and SQL work of every request in the Prometheus metrics.
+
+    Requests are labelled with their URL name (e.g. `product_list`,
+    `category-detail`), or `unmatched` when no route resolved. Query counts
+    and database time come from QueryInstrumentationMiddleware, which must
+    come after this middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        return self.record(request, response, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        return self.record(request, response, started)
+
+    def record(self, request, response, started):
+        seconds = time.perf_counter() - started
+        match = request.resolver_match
+        recorder = getattr(request, 'sql_recorder', None)
+        record_request(
+            match.view_name if match else 'unmatched', request.method, response.status_code, seconds,
+            queries=len(recorder.queries) if recorder else None,
+            db_seconds=recorder.db_ms / 1000 if recorder else None,
+        )
+        return response
+
+
+class QueryInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.max_queries = settings.SQL_LOG_MAX_QUERIES
+        self.max_db_ms = settings.SQL_LOG_MAX_DB_MS
+        self.slowest = settings.SQL_LOG_SLOWEST
+
+    def instrument(self, recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with self.instrument(recorder):
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        # Connections are per thread: wrap the ones of the thread Django runs this request's sync code in.
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        stack = await sync_to_async(self.instrument)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, recorder, started)
+
+    def finish(self, request, response, recorder, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        # Read by MetricsMiddleware.
+        request.sql_recorder = recorder
+
+        count, db_ms = len(recorder.queries), recorder.db_ms
+        response.headers['Server-Timing'] = (
+            f'db;dur={db_ms:.2f};desc="{count} queries", app;dur={total_ms:.2f}'
+        )
+        self.log(request, response, recorder, total_ms)
+        return response
+
+    def log(self, request, response, recorder, total_ms):
+        count, db_ms = len(recorder.queries), recorder.db_ms
+        exceeded = count > self.max_queries or db_ms > self.max_db_ms
+        level = logging.WARNING if exceeded else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': count,
+            'db_ms': round(db_ms, 2),
+            'total_ms': round(total_ms, 2),
+            'slowest': [
+                {'sql': sql, 'ms': round(duration, 2), 'alias': alias}
+                for sql, duration, alias in heapq.nlargest(self.slowest, recorder.queries, key=lambda q: q[1])
+            ],
+        }
+        if count:
+            sql, repeats = Counter(sql for sql, _, _ in recorder.queries).most_common(1)[0]
+            record['most_repeated'] = {'sql': sql, 'count': repeats}
+        if exceeded:
+            record['all'] = [
+                {'sql': sql, 'ms': round(duration, 2), 'alias': alias} for sql, duration, alias in recorder.queries
+            ]
+        logger.log(
+            level,
+            'method=%s path=%s status=%s queries=%d db_ms=%.2f total_ms=%.2f%s',
+            request.method, request.path, response.status_code, count, db_ms, total_ms,
+            ' thresholds_exceeded=1' if exceeded else '',
+            extra={'sql': record},
+        )
+
+
+class InlineExecutor(Executor):
+    """
+    Executor running each call right away in the submitting thread.
+
+    The event loop the call is submitted from is hidden while it runs, so
+    the ORM's async-safety check sees a plain sync thread, which it is: the
+    loop cannot run anything else until the call returns.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        loop = asyncio._get_running_loop()
+        asyncio._set_running_loop(None)
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        finally:
+            asyncio._set_running_loop(loop)
+        return future
+
+
+class ProfilingMiddleware:
+    """
+    Run requests that ask for it under a profiler, for staff users only (see config.profiling).
+
+    Both profilers follow a single thread, so under ASGI a profiled request
+    is run in one worker thread on a private event loop, with its
+    thread-sensitive sync_to_async calls (the ORM, sync views) run inline
+    on that thread. Async and sync code of the request both end up in the
+    profile. Sync code calling back into async_to_sync is not supported
+    there: it would wait on the private loop it is blocking.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mode = requested_mode(request)
+        user = staff_user(request) if mode else None
+        if user is None:
+            return self.get_response(request)
+        return run_profiled(mode, self.get_response, request, user)
+
+    async def __acall__(self, request):
+        mode = requested_mode(request)
+        user = await sync_to_async(staff_user)(request) if mode else None
+        if user is None:
+            return await self.get_response(request)
+        return await sync_to_async(run_profiled)(mode, self.run_on_private_loop, request, user)
+
+    def run_on_private_loop(self, request):
+        # sync_to_async sends thread-sensitive calls to AsyncToSync's current executor when there is one.
+        previous = getattr(AsyncToSync.executors, 'current', None)
+        AsyncToSync.executors.current = InlineExecutor()
+        try:
+            return asyncio.run(self.get_response(request))
+        finally:
+            AsyncToSync.executors.current = previous
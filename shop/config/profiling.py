@@ -0,0 +1,247 @@
+"""
+On-demand profiling of single requests for staff users.
+
+A request from a staff user carrying an `X-Profile` header or a `profile`
+query parameter is run under a profiler by ProfilingMiddleware:
+
+- `cprofile` (or `1`): deterministic cProfile, stored as a pstats `.prof`
+  file (open with `python -m pstats` or snakeviz)
+- `sample`: a sampling profiler reading the request thread's stack every
+  millisecond, stored as speedscope JSON (https://www.speedscope.app)
+
+Profiles are written to PROFILES_ROOT together with a `.meta.json` file
+holding the view name, path, status and duration, and only the newest
+PROFILES_KEEP are kept. The response carries the profile id in an
+`X-Profile-Id` header; staff can list profiles at /api/profiles/ and
+download one at /api/profiles/<id>.
+"""
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+
+PROFILE_ID_RE = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+
+# Profile mode -> file extension.
+EXTENSIONS = {
+    'cprofile': '.prof',
+    'sample': '.speedscope.json',
+}
+
+
+class SamplingProfiler:
+    """Samples the stack of the thread that entered it every `interval` seconds."""
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.frames = []
+        self.frame_ids = {}
+        self.samples = []
+        self.weights = []
+
+    def __enter__(self):
+        self.target = threading.get_ident()
+        self.stopped = threading.Event()
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(self.frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append((now - last) * 1000)
+            last = now
+
+    def frame_id(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self.frame_ids:
+            self.frame_ids[key] = len(self.frames)
+            self.frames.append({'name': code.co_name, 'file': code.co_filename, 'line': code.co_firstlineno})
+        return self.frame_ids[key]
+
+    def speedscope(self, name):
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'shop-api',
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': sum(self.weights),
+                'samples': self.samples,
+                'weights': self.weights,
+            }],
+        }
+
+
+def requested_mode(request):
+    """The profile mode asked for by `request`, or None."""
+    value = request.headers.get('X-Profile') or request.GET.get('profile')
+    if not value:
+        return None
+    value = value.lower()
+    if value in ('1', 'true'):
+        return 'cprofile'
+    return value if value in EXTENSIONS else None
+
+
+def staff_user(request):
+    """
+    The staff user making the request, or None.
+
+    Checks the session user first and then, for API clients without a
+    session, the configured REST framework authentication classes.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        try:
+            user = Request(request, authenticators=authenticators).user
+        except APIException:
+            return None
+    return user if user and user.is_staff else None
+
+
+def profile_path(profile_id, extension):
+    if not PROFILE_ID_RE.match(profile_id):
+        raise ValueError(f'Invalid profile id {profile_id!r}')
+    return os.path.join(settings.PROFILES_ROOT, profile_id + extension)
+
+
+def save_profile(mode, profiler, meta):
+    """Write a finished profile and its metadata; returns the new profile id."""
+    os.makedirs(settings.PROFILES_ROOT, exist_ok=True)
+    profile_id = f"{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    path = profile_path(profile_id, EXTENSIONS[mode])
+    if mode == 'cprofile':
+        profiler.dump_stats(path)
+    else:
+        with open(path, 'w') as stream:
+            json.dump(profiler.speedscope(f"{meta['method']} {meta['path']}"), stream)
+    meta = dict(meta, id=profile_id, mode=mode, file=os.path.basename(path))
+    with open(profile_path(profile_id, '.meta.json'), 'w') as stream:
+        json.dump(meta, stream)
+    prune_profiles(settings.PROFILES_KEEP)
+    return profile_id
+
+
+def list_profiles():
+    """Metadata of the stored profiles, newest first."""
+    try:
+        names = os.listdir(settings.PROFILES_ROOT)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in sorted(names, reverse=True):
+        if name.endswith('.meta.json'):
+            with open(os.path.join(settings.PROFILES_ROOT, name)) as stream:
+                profiles.append(json.load(stream))
+    return profiles
+
+
+def prune_profiles(keep):
+    for meta in list_profiles()[keep:]:
+        for name in (meta['file'], meta['id'] + '.meta.json'):
+            try:
+                os.remove(os.path.join(settings.PROFILES_ROOT, name))
+            except FileNotFoundError:
+                pass
+
+
+def run_profiled(mode, get_response, request, user):
+    """Run `get_response(request)` for staff `user` under the `mode` profiler and store the result."""
+    profiler = cProfile.Profile() if mode == 'cprofile' else SamplingProfiler()
+    started = time.perf_counter()
+    with profiler:
+        response = get_response(request)
+    duration_ms = (time.perf_counter() - started) * 1000
+
+    match = request.resolver_match
+    profile_id = save_profile(mode, profiler, {
+        'view': match.view_name if match else None,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(duration_ms, 2),
+        'user': user.get_username(),
+        'created_at': timezone.now().isoformat(),
+    })
+    response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+class ProfileListView(APIView):
+    """
+    API endpoint listing stored request profiles.
+
+    GET /profiles/
+    - Metadata of each profile (view, path, status, duration, user),
+      newest first, with its download URL
+
+    Restricted to staff users.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        profiles = list_profiles()
+        for meta in profiles:
+            meta['url'] = request.build_absolute_uri(reverse('profile_detail', args=[meta['id']]))
+        return Response(profiles)
+
+
+class ProfileDetailView(APIView):
+    """
+    API endpoint downloading one stored profile.
+
+    GET /profiles/{id}
+    - The pstats (.prof) or speedscope JSON file as an attachment
+
+    Restricted to staff users.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id, *args, **kwargs):
+        for extension in EXTENSIONS.values():
+            try:
+                path = profile_path(profile_id, extension)
+            except ValueError:
+                raise Http404
+            if os.path.exists(path):
+                return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
+        raise Http404
@@ -0,0 +1,71 @@
+"""
+orjson-backed JSON renderer, enabled with FAST_JSON=True (see settings).
+
+orjson encodes dicts, lists, strings, numbers and datetimes in C, so only
+the values DRF's JSONEncoder has to special-case (Decimal, lazy strings,
+UUIDs, querysets...) reach a Python hook. Output is byte-for-byte the
+compact JSONRenderer output. Pretty-printed responses (`indent`),
+non-default COMPACT_JSON/UNICODE_JSON settings, values orjson cannot encode
+(such as integers beyond 64 bits), NaN and infinity, which orjson would
+write as null, and floats whose repr has an exponent, which orjson writes
+differently (1e16 rather than 1e+16, 0.00001 rather than 1e-05), fall back
+to JSONRenderer, so they raise or render exactly as it does.
+"""
+import math
+import re
+
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Bytes orjson writes for floats it formats unlike JSONRenderer: NaN and infinity
+# as null, an exponent, a fraction below 1e-4 or 17 or more integer digits.
+# Strings can match too; that only costs a walk over the data.
+SUSPECT_FLOAT = re.compile(rb'null|\de|0\.0000|\d{17}')
+
+
+def has_divergent_float(value):
+    """True if `value` is or contains a float orjson does not write like JSONRenderer."""
+    if isinstance(value, float):
+        return not math.isfinite(value) or 'e' in repr(value)
+    if isinstance(value, dict):
+        return any(has_divergent_float(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(has_divergent_float(item) for item in value)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Drop-in JSONRenderer encoding with orjson; DRF's JSONEncoder handles the remaining types."""
+    options = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+    encoder = JSONEncoder()
+
+    def default(self, obj):
+        value = self.encoder.default(obj)
+        if has_divergent_float(value):
+            # E.g. Decimal('NaN') with COERCE_DECIMAL_TO_STRING off; aborts orjson.
+            raise TypeError('float orjson would write differently')
+        return value
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (orjson is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Only output that may hold a divergent float is worth walking the data for.
+        if SUSPECT_FLOAT.search(ret) and has_divergent_float(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escape U+2028/U+2029 like JSONRenderer, keeping the output a JavaScript subset.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,191 @@
+"""
+The OpenAPI schema, generated once instead of on every documentation request.
+
+`manage.py build_openapi_schema` writes the schema in each spec format to
+SCHEMA_ROOT, next to a fingerprint of the API it describes: every endpoint's
+path, method and view, and the fields of its serializer. The schema views
+serve those bytes from memory with a strong ETag, so clients revalidate
+with `If-None-Match` and get a 304.
+
+The fingerprint is recomputed only when the URLconf is reloaded (once per
+process, or after ROOT_URLCONF changes). If it no longer matches the file,
+e.g. after a deploy that skipped the build step, the schema is generated in
+process once and a warning is logged. The Swagger and ReDoc pages load the
+schema from the same cached documents.
+
+The built schema carries no host, so clients use the one serving it.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import get_resolver
+from django.utils.cache import get_conditional_response, quote_etag
+
+from rest_framework import permissions
+
+from drf_yasg import openapi
+from drf_yasg.renderers import OpenAPIRenderer, SwaggerJSONRenderer, SwaggerYAMLRenderer
+from drf_yasg.views import get_schema_view
+
+
+logger = logging.getLogger(__name__)
+
+API_INFO = openapi.Info(
+    title="Snippets API",
+    default_version='v1',
+    description="Test description",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+# Spec format -> (file name, renderer); `openapi` is the JSON document under another media type.
+SPEC_FORMATS = {
+    'json': ('openapi.json', SwaggerJSONRenderer),
+    'openapi': ('openapi.json', OpenAPIRenderer),
+    'yaml': ('openapi.yaml', SwaggerYAMLRenderer),
+}
+SPEC_RENDERERS = tuple(renderer for _, renderer in SPEC_FORMATS.values())
+FINGERPRINT_FILE = 'fingerprint.json'
+
+Document = namedtuple('Document', 'content etag')
+
+
+def make_document(content):
+    return Document(content, quote_etag(hashlib.sha256(content).hexdigest()[:32]))
+
+
+def serializer_signature(view):
+    try:
+        serializer_class = view.get_serializer_class()
+    except Exception:
+        serializer_class = getattr(view, 'serializer_class', None)
+    if serializer_class is None:
+        return ''
+    try:
+        # Lists every field with its type and options, nested serializers included.
+        return repr(serializer_class())
+    except Exception:
+        return f'{serializer_class.__module__}.{serializer_class.__qualname__}'
+
+
+def api_fingerprint():
+    """A hash of everything the schema is generated from: endpoints, views and serializer fields."""
+    digest = hashlib.sha256()
+    generator = SchemaView.generator_class(API_INFO)
+    for path, (view_class, methods) in sorted(generator.get_endpoints(None).items()):
+        for method, view in methods:
+            digest.update(f'{path} {method} {view_class.__module__}.{view_class.__qualname__}\n'.encode())
+            digest.update((view_class.__doc__ or '').encode())
+            digest.update(serializer_signature(view).encode())
+    return digest.hexdigest()
+
+
+def generate_documents():
+    """Generate the schema and render it in each spec format; returns {format: Document}."""
+    schema = SchemaView.generator_class(API_INFO).get_schema(request=None, public=True)
+    return {name: make_document(renderer().render(schema)) for name, (_, renderer) in SPEC_FORMATS.items()}
+
+
+def replace_file(path, content):
+    """Write `content` to `path` atomically, so running processes never read half a file."""
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as stream:
+        stream.write(content)
+    os.replace(temporary, path)
+
+
+def write_documents(documents, fingerprint, root=None):
+    root = root or settings.SCHEMA_ROOT
+    os.makedirs(root, exist_ok=True)
+    for name, (filename, _) in SPEC_FORMATS.items():
+        replace_file(os.path.join(root, filename), documents[name].content)
+    # Written last: a build interrupted halfway leaves the previous fingerprint, which no longer matches.
+    replace_file(os.path.join(root, FINGERPRINT_FILE), json.dumps({'fingerprint': fingerprint}).encode())
+
+
+def read_documents(fingerprint, root=None):
+    """The documents built for `fingerprint`, or None when SCHEMA_ROOT holds none or a stale build."""
+    root = root or settings.SCHEMA_ROOT
+    try:
+        with open(os.path.join(root, FINGERPRINT_FILE)) as stream:
+            if json.load(stream).get('fingerprint') != fingerprint:
+                return None
+        contents = {}
+        for filename, _ in SPEC_FORMATS.values():
+            if filename not in contents:
+                with open(os.path.join(root, filename), 'rb') as stream:
+                    contents[filename] = stream.read()
+    except (OSError, ValueError):
+        return None
+    return {name: make_document(contents[filename]) for name, (filename, _) in SPEC_FORMATS.items()}
+
+
+def build_schema(root=None):
+    """Generate the schema and write it to SCHEMA_ROOT; returns the fingerprint."""
+    fingerprint = api_fingerprint()
+    write_documents(generate_documents(), fingerprint, root)
+    return fingerprint
+
+
+class SchemaCache:
+    """The schema documents of the current URLconf, loaded or generated once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resolver = None
+        self.fingerprint = None
+        self.documents = None
+
+    def get(self, spec_format):
+        resolver = get_resolver()
+        if resolver is not self.resolver:
+            with self.lock:
+                if resolver is not self.resolver:
+                    self.load()
+                    self.resolver = resolver
+        return self.documents[spec_format]
+
+    def load(self):
+        fingerprint = api_fingerprint()
+        if fingerprint == self.fingerprint:
+            return
+        documents = read_documents(fingerprint)
+        if documents is None:
+            logger.warning('No OpenAPI schema built for the current API in %s; generating it. '
+                           'Run `manage.py build_openapi_schema` when deploying.', settings.SCHEMA_ROOT)
+            documents = generate_documents()
+        self.documents, self.fingerprint = documents, fingerprint
+
+    def clear(self):
+        with self.lock:
+            self.resolver = self.fingerprint = self.documents = None
+
+
+schema_cache = SchemaCache()
+
+
+class SchemaView(get_schema_view(API_INFO, public=True, permission_classes=(permissions.AllowAny,))):
+    """
+    API schema in JSON or YAML, and the Swagger and ReDoc pages reading it.
+
+    The schema is served from schema_cache with a strong ETag and
+    `Cache-Control: no-cache`, so browsers revalidate instead of refetching.
+    """
+
+    def get(self, request, version='', format=None):
+        if not isinstance(request.accepted_renderer, SPEC_RENDERERS):
+            # The UI pages themselves embed no endpoints; they fetch the schema separately.
+            return super().get(request, version, format)
+        renderer = request.accepted_renderer
+        document = schema_cache.get(renderer.format.lstrip('.'))
+        response = HttpResponse(document.content, content_type=f'{renderer.media_type}; charset=utf-8')
+        response.headers['ETag'] = document.etag
+        response.headers['Cache-Control'] = 'no-cache'
+        return get_conditional_response(request, etag=document.etag, response=response)
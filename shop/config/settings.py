@@ -11,9 +11,10 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import tempfile
 
 from pathlib import Path
-from decouple import config
+from decouple import Choices, Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,9 +48,12 @@ INSTALLED_APPS = [
     
     'product.apps.ProductConfig',
     'account.apps.AccountConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'config.middleware.MetricsMiddleware',
+    'config.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +61,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.dbrouter.ReplicaRoutingMiddleware',
+    'config.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -90,6 +96,53 @@ DATABASES = {
     }
 }
 
+# SQLite connection tuning, picked with SQLITE_PROFILE (compare them with `python -m benchmarks.sqlite_profile`):
+# - default: Django's stock connections (rollback journal, deferred transactions)
+# - production: WAL, so readers never wait for the writer and the writer only
+#   waits for other writers, plus the pragmas and lock handling below
+SQLITE_PROFILES = {
+    'default': {},
+    'production': {
+        # Seconds to wait for another writer's lock before failing with "database is locked"
+        'timeout': 20,
+        # Take the write lock when a transaction starts; a deferred transaction that
+        # upgrades its read lock midway fails at once instead of waiting
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ';'.join([
+            'PRAGMA journal_mode=WAL',
+            # With WAL, only checkpoints fsync; a power loss can lose the last commits, never corrupt
+            'PRAGMA synchronous=NORMAL',
+            # 64 MiB page cache per connection (negative values are KiB)
+            'PRAGMA cache_size=-65536',
+            'PRAGMA mmap_size=268435456',
+            'PRAGMA temp_store=MEMORY',
+        ]),
+    },
+}
+SQLITE_PROFILE = config('SQLITE_PROFILE', default='default', cast=Choices(list(SQLITE_PROFILES)))
+DATABASES['default']['OPTIONS'] = SQLITE_PROFILES[SQLITE_PROFILE]
+
+# SQLite files standing in for read replicas of the primary, comma-separated; safe catalog
+# requests read from them (see config/dbrouter.py). Refresh with `manage.py refresh_read_replicas`.
+DATABASE_REPLICAS = config('DATABASE_REPLICAS', default='', cast=Csv())
+READ_REPLICAS = []
+for number, path in enumerate(DATABASE_REPLICAS, 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'OPTIONS': SQLITE_PROFILES[SQLITE_PROFILE],
+        'TEST': {'MIRROR': 'default'},
+    }
+    READ_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['config.dbrouter.ReplicaRouter']
+
+# Apps whose safe-method views may read from a replica
+REPLICA_APPS = ['product']
+
+# Seconds a client that wrote keeps reading from the primary
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -143,6 +196,32 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 30
 }
 
+# Opt in to the orjson-backed JSON renderer and parser
+FAST_JSON = config('FAST_JSON', default=False, cast=bool)
+if FAST_JSON:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = (
+        'config.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    )
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = (
+        'config.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    )
+
+
+# Per-request SQL instrumentation: the full query list of a request is logged
+# once it runs more queries or spends more database time than this
+SQL_LOG_MAX_QUERIES = config('SQL_LOG_MAX_QUERIES', default=50, cast=int)
+SQL_LOG_MAX_DB_MS = config('SQL_LOG_MAX_DB_MS', default=500, cast=float)
+# Number of slowest statements included in every request's log record
+SQL_LOG_SLOWEST = 3
+
+# Prometheus metrics: directory of the per-process metric files (shared by all
+# workers of a deployment) and an optional bearer token required by /metrics
+METRICS_ROOT = config('METRICS_ROOT', default=os.path.join(tempfile.gettempdir(), 'shop-metrics'))
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 
 AUTH_USER_MODEL = 'account.Customer'
 
@@ -152,3 +231,19 @@ MEDIA_ROOT = os.path.join(os.path.dirname(BASE_DIR), 'mediafiles')
 
 # URL used to access the media
 MEDIA_URL = '/media/'
+
+# Seconds before an unreleased stock reservation expires
+RESERVATION_TTL = 15 * 60
+
+# Request profiles taken on demand by staff (see config/profiling.py)
+PROFILES_ROOT = os.path.join(os.path.dirname(BASE_DIR), 'profiles')
+PROFILES_KEEP = 200
+
+# OpenAPI schema written by `manage.py build_openapi_schema` (see config/schema.py)
+SCHEMA_ROOT = os.path.join(os.path.dirname(BASE_DIR), 'schema')
+
+# Hash uploads while they stream in, for content-addressed product images
+FILE_UPLOAD_HANDLERS = [
+    'product.uploadhandlers.HashingMemoryFileUploadHandler',
+    'product.uploadhandlers.HashingTemporaryFileUploadHandler',
+]
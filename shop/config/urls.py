@@ -18,34 +18,21 @@ from django.contrib import admin
 from django.urls import path, include
 from django.urls import re_path
 
-from rest_framework import permissions
-
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-
-
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Snippets API",
-      default_version='v1',
-      description="Test description",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@snippets.local"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
+from .metrics import metrics_view
+from .profiling import ProfileDetailView, ProfileListView
+from .schema import SchemaView
 
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('product.urls')),  
+    path('api/profiles/', ProfileListView.as_view(), name='profile_list'),
+    path('api/profiles/<str:profile_id>', ProfileDetailView.as_view(), name='profile_detail'),
+    path('metrics', metrics_view, name='metrics'),
 
    # API Documentation URLs (Swagger and ReDoc)
-   path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-   path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-   path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+   path('swagger<format>/', SchemaView.without_ui(), name='schema-json'),
+   path('swagger/', SchemaView.with_ui('swagger'), name='schema-swagger-ui'),
+   path('redoc/', SchemaView.with_ui('redoc'), name='schema-redoc'),
 ]
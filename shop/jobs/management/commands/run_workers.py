@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from jobs.queue import claim, is_locked, release, release_stale, run_jobs
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs with a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Worker threads (default: 4)')
+        parser.add_argument('--batch-size', type=int, default=50, help='Jobs claimed at a time (default: 50)')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when idle')
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=600,
+            help='Requeue jobs left running for this many seconds (default: 600)'
+        )
+        parser.add_argument(
+            '--release-interval',
+            type=float,
+            default=60.0,
+            help='Seconds between checks for stale jobs while running (default: 60)'
+        )
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is drained')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.processed = 0
+        self.failed = 0
+        self.counter_lock = threading.Lock()
+        self.release_lock = threading.Lock()
+        self.next_release = 0
+
+        self.maybe_release_stale(options)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            workers = [executor.submit(self.work, options) for _ in range(options['threads'])]
+            try:
+                for worker in workers:
+                    worker.result()
+            except KeyboardInterrupt:
+                self.stop.set()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Ran {self.processed} jobs in {elapsed:.2f}s ({self.failed} failed)'
+        ))
+
+    def maybe_release_stale(self, options):
+        """Requeue stale jobs, at most once per --release-interval across all workers."""
+        with self.release_lock:
+            if time.monotonic() < self.next_release:
+                return
+            self.next_release = time.monotonic() + options['release_interval']
+        released = release_stale(options['stale_after'])
+        if released:
+            self.stdout.write(f'Requeued {released} stale jobs')
+
+    def work(self, options):
+        try:
+            while not self.stop.is_set():
+                jobs = []
+                try:
+                    self.maybe_release_stale(options)
+                    jobs = claim(options['batch_size'])
+                    if not jobs:
+                        if options['once']:
+                            return
+                        self.stop.wait(options['poll_interval'])
+                        continue
+                    failed = run_jobs(jobs)
+                except OperationalError as exc:
+                    # Still locked after the queue's own retries: back off instead of ending the
+                    # worker, handing back the jobs it claimed but did not finish.
+                    if not is_locked(exc):
+                        raise
+                    logger.warning('Database is locked, worker backing off: %s', exc)
+                    self.hand_back(jobs)
+                    self.stop.wait(options['poll_interval'])
+                    continue
+                with self.counter_lock:
+                    self.processed += len(jobs)
+                    self.failed += failed
+        finally:
+            connection.close()
+
+    def hand_back(self, jobs):
+        if not jobs:
+            return
+        try:
+            release(jobs)
+        except OperationalError as exc:
+            if not is_locked(exc):
+                raise
+            # The periodic release_stale() requeues them once they are --stale-after old.
+            logger.warning('Could not requeue %d claimed jobs: %s', len(jobs), exc)
@@ -0,0 +1,99 @@
+from django.db import models
+from django.db.models import Q
+
+
+class Job(models.Model):
+    """
+    A unit of deferred work stored in the database and run by `manage.py run_workers`.
+
+    Attributes:
+        task (CharField): Name of the registered task to run.
+        key (CharField): Optional deduplication key; only one pending job may hold a key.
+        payload (JSONField): Arguments passed to the task.
+        status (CharField): pending, running or failed (finished jobs are deleted).
+        attempts (PositiveIntegerField): Number of times the job has been tried.
+        max_attempts (PositiveIntegerField): Attempts allowed before the job is marked failed.
+        run_after (DateTimeField): The job is not claimed before this time (retry backoff).
+        locked_by (CharField): Token of the worker batch that claimed the job.
+        last_error (TextField): Traceback of the last failure.
+        created_at (DateTimeField): Enqueue timestamp.
+        updated_at (DateTimeField): Last update timestamp.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    )
+
+    task = models.CharField(
+        max_length=100,
+        verbose_name='Task'
+    )
+    key = models.CharField(
+        max_length=200,
+        blank=True,
+        null=True,
+        verbose_name='Deduplication Key'
+    )
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Payload'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Status'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Attempts'
+    )
+    max_attempts = models.PositiveIntegerField(
+        default=3,
+        verbose_name='Max Attempts'
+    )
+    run_after = models.DateTimeField(
+        verbose_name='Run After'
+    )
+    locked_by = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name='Locked By'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Last Error'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Created At'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Updated At'
+    )
+
+    def __str__(self):
+        return f'{self.task} #{self.pk} ({self.status})'
+
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['locked_by']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=Q(status='pending'),
+                name='jobs_job_unique_pending_key',
+            ),
+        ]
@@ -0,0 +1,194 @@
+import logging
+import random
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+# Registered tasks by name: (function, batch, max_attempts).
+registry = {}
+
+
+def is_locked(exc):
+    return isinstance(exc, OperationalError) and 'locked' in str(exc)
+
+
+def retry_locked(func, attempts=50):
+    """
+    Call `func`, retrying when SQLite reports the database or a table as locked.
+
+    Concurrent workers write to the same table; when SQLite refuses a write
+    instead of waiting for the lock, `func` is retried after a short,
+    jittered pause.
+    """
+    for attempt in range(attempts):
+        try:
+            return func()
+        except OperationalError as exc:
+            if not is_locked(exc) or attempt == attempts - 1:
+                raise
+            time.sleep(random.uniform(0.001, 0.005) * min(attempt + 1, 10))
+
+
+def task(name, batch=False, max_attempts=3):
+    """
+    Register a function as a queue task.
+
+    A regular task is called once per job as `func(**payload)`. A `batch`
+    task is called once per claimed group of jobs with the list of payloads,
+    so it can do its work in bulk; if it raises, the whole group is retried.
+    """
+    def decorator(func):
+        registry[name] = (func, batch, max_attempts)
+        func.task_name = name
+        return func
+    return decorator
+
+
+def enqueue(task_name, payload=None, key=None, delay=0):
+    """
+    Add a job for `task_name`.
+
+    With a `key`, a job that is still pending under the same key absorbs the
+    new one, so bursts of writes to the same object queue a single job.
+    Returns the queued (or existing) Job.
+    """
+    _, _, max_attempts = registry[task_name]
+    job = Job(
+        task=task_name,
+        key=key,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    if key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+        return job
+    except IntegrityError:
+        existing = Job.objects.filter(key=key, status=Job.PENDING).first()
+        if existing is not None:
+            return existing
+        # The pending job was claimed in the meantime; queue a fresh one.
+        job.save()
+        return job
+
+
+def claim(limit, task_name=None):
+    """
+    Atomically mark up to `limit` due pending jobs as running and return them.
+
+    The conditional UPDATE only takes rows that are still pending, so
+    concurrent workers never claim the same job.
+    """
+    token = uuid.uuid4().hex
+
+    def attempt():
+        due = Job.objects.filter(status=Job.PENDING, run_after__lte=timezone.now())
+        if task_name:
+            due = due.filter(task=task_name)
+        ids = list(due.values_list('pk', flat=True)[:limit])
+        if ids:
+            Job.objects.filter(pk__in=ids, status=Job.PENDING).update(
+                status=Job.RUNNING, locked_by=token, updated_at=timezone.now()
+            )
+        return list(Job.objects.filter(locked_by=token, status=Job.RUNNING))
+
+    return retry_locked(attempt)
+
+
+def _requeue(jobs):
+    released = 0
+    for job in jobs:
+        job.status = Job.PENDING
+        job.locked_by = ''
+        try:
+            with transaction.atomic():
+                job.save(update_fields=['status', 'locked_by', 'updated_at'])
+            released += 1
+        except IntegrityError:
+            # A pending job with the same key was queued meanwhile and absorbs this one.
+            job.delete()
+    return released
+
+
+def release_stale(seconds):
+    """Return jobs left running longer than `seconds` (e.g. by a killed worker) to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=seconds)
+    return _requeue(Job.objects.filter(status=Job.RUNNING, updated_at__lt=cutoff))
+
+
+def release(jobs):
+    """Return the claimed `jobs` that are still running, i.e. were not finished, to the queue."""
+    ids = [job.pk for job in jobs]
+    return retry_locked(lambda: _requeue(Job.objects.filter(pk__in=ids, status=Job.RUNNING)))
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that failed `attempts` times."""
+    return min(2 ** attempts, 300)
+
+
+def _finish(jobs, error=None):
+    if error is None:
+        retry_locked(Job.objects.filter(pk__in=[job.pk for job in jobs]).delete)
+        return
+    now = timezone.now()
+    for job in jobs:
+        job.attempts += 1
+        job.last_error = error
+        job.locked_by = ''
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+        else:
+            job.status = Job.PENDING
+            job.run_after = now + timedelta(seconds=backoff(job.attempts))
+        retry_locked(lambda: _save_finished(job))
+
+
+def _save_finished(job):
+    try:
+        with transaction.atomic():
+            job.save(update_fields=['attempts', 'last_error', 'locked_by', 'status', 'run_after', 'updated_at'])
+    except IntegrityError:
+        # A newer pending job with the same key already covers this work.
+        job.delete()
+
+
+def run_jobs(jobs):
+    """Run claimed jobs, grouping batch tasks; returns the number of jobs that failed."""
+    failed = 0
+    by_task = {}
+    for job in jobs:
+        by_task.setdefault(job.task, []).append(job)
+    for task_name, group in by_task.items():
+        func, batch, _ = registry.get(task_name, (None, False, 0))
+        if func is None:
+            _finish(group, error=f'Unknown task "{task_name}"')
+            failed += len(group)
+            continue
+        units = [group] if batch else [[job] for job in group]
+        for unit in units:
+            try:
+                if batch:
+                    func([job.payload for job in unit])
+                else:
+                    func(**unit[0].payload)
+            except Exception:
+                logger.exception('Job %s failed', task_name)
+                _finish(unit, error=traceback.format_exc())
+                failed += len(unit)
+            else:
+                _finish(unit)
+    return failed
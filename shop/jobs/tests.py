@@ -0,0 +1,179 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import OperationalError, connections
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .models import Job
+from . import queue
+from .queue import claim, enqueue, run_jobs, task
+
+
+calls = []
+
+
+@task('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task('tests.record_batch', batch=True)
+def record_batch(payloads):
+    calls.append(sorted(payload['value'] for payload in payloads))
+
+
+@task('tests.abandon')
+def abandon(job_id):
+    # Leaves another job claimed by a worker that died long ago.
+    Job.objects.filter(pk=job_id).update(
+        status=Job.RUNNING, locked_by='dead', updated_at=timezone.now() - timedelta(hours=1)
+    )
+
+
+@task('tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_runs_and_deletes_finished_jobs(self):
+        enqueue('tests.record', {'value': 1})
+        self.assertEqual(run_jobs(claim(10)), 0)
+        self.assertEqual(calls, [1])
+        self.assertFalse(Job.objects.exists())
+
+    def test_deduplicates_pending_jobs_by_key(self):
+        first = enqueue('tests.record', {'value': 1}, key='product:1')
+        second = enqueue('tests.record', {'value': 2}, key='product:1')
+        self.assertEqual(first.pk, second.pk)
+        claimed = claim(10)
+        # Once the job is running, new work for the key is queued again.
+        third = enqueue('tests.record', {'value': 3}, key='product:1')
+        self.assertNotEqual(third.pk, first.pk)
+        run_jobs(claimed)
+        self.assertEqual(calls, [1])
+
+    def test_batch_task_gets_all_payloads(self):
+        for value in (3, 1, 2):
+            enqueue('tests.record_batch', {'value': value})
+        run_jobs(claim(10))
+        self.assertEqual(calls, [[1, 2, 3]])
+
+    def test_retries_with_backoff_then_fails(self):
+        enqueue('tests.explode')
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertEqual(run_jobs(claim(10)), 1)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn('boom', job.last_error)
+        self.assertEqual(claim(10), [])
+
+        Job.objects.update(run_after=timezone.now() - timedelta(seconds=1))
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            run_jobs(claim(10))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_claimed_jobs_are_not_claimed_twice(self):
+        enqueue('tests.record', {'value': 1})
+        self.assertEqual(len(claim(10)), 1)
+        self.assertEqual(claim(10), [])
+
+
+
+class RunWorkersCommandTest(TransactionTestCase):
+    """Worker threads share a migrated SQLite file, so they contend for its locks like in production."""
+
+    def setUp(self):
+        calls.clear()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        # Worker threads open their connections from these settings; this thread
+        # swaps its test-database connection for one to the file until cleanup.
+        test_settings = connections.settings['default']
+        file_settings = {**test_settings, 'NAME': os.path.join(root.name, 'jobs.sqlite3')}
+        test_connection = connections['default']
+        connections.settings['default'] = file_settings
+        connections['default'] = type(test_connection)(file_settings, 'default')
+        self.addCleanup(connections.__setitem__, 'default', test_connection)
+        self.addCleanup(connections.settings.__setitem__, 'default', test_settings)
+        self.addCleanup(lambda: connections['default'].close())
+        call_command('migrate', 'jobs', verbosity=0)
+
+    def test_drains_queue_with_threads(self):
+        for value in range(200):
+            enqueue('tests.record', {'value': value})
+        out = StringIO()
+        call_command('run_workers', '--once', '--threads', '8', '--batch-size', '3', stdout=out)
+        self.assertIn('Ran 200 jobs', out.getvalue())
+        self.assertEqual(sorted(calls), list(range(200)))
+        self.assertFalse(Job.objects.exists())
+
+    def test_locked_database_does_not_end_workers(self):
+        for value in range(20):
+            enqueue('tests.record', {'value': value})
+        real_claim = queue.claim
+        failures = iter([OperationalError('database is locked')] * 3)
+
+        def flaky_claim(limit):
+            error = next(failures, None)
+            if error is not None:
+                raise error
+            return real_claim(limit)
+
+        out = StringIO()
+        with patch('jobs.management.commands.run_workers.claim', flaky_claim):
+            call_command('run_workers', '--once', '--threads', '2', '--batch-size', '3',
+                         '--poll-interval', '0', stdout=out)
+        self.assertIn('Ran 20 jobs', out.getvalue())
+        self.assertEqual(sorted(calls), list(range(20)))
+
+    def test_unfinished_jobs_are_handed_back(self):
+        for value in range(20):
+            enqueue('tests.record', {'value': value})
+        failures = iter([OperationalError('database is locked')])
+
+        def flaky_run_jobs(jobs):
+            error = next(failures, None)
+            if error is not None:
+                raise error
+            return run_jobs(jobs)
+
+        out = StringIO()
+        with patch('jobs.management.commands.run_workers.run_jobs', flaky_run_jobs):
+            call_command('run_workers', '--once', '--threads', '1', '--batch-size', '5',
+                         '--poll-interval', '0', stdout=out)
+        self.assertIn('Ran 20 jobs', out.getvalue())
+        self.assertEqual(sorted(calls), list(range(20)))
+
+    def test_stale_jobs_are_released_while_running(self):
+        # Not due yet, so the worker only sees it again through release_stale().
+        abandoned = enqueue('tests.record', {'value': 7}, delay=3600)
+        enqueue('tests.abandon', {'job_id': abandoned.pk})
+        out = StringIO()
+        call_command('run_workers', '--once', '--threads', '1', '--batch-size', '1',
+                     '--stale-after', '60', '--release-interval', '0', stdout=out)
+        self.assertIn('Requeued 1 stale jobs', out.getvalue())
+        self.assertEqual(Job.objects.get(pk=abandoned.pk).status, Job.PENDING)
+
+    def test_claim_retries_while_locked(self):
+        enqueue('tests.record', {'value': 1})
+        real_filter = Job.objects.filter
+        failures = iter([OperationalError('database table is locked')] * 2)
+
+        def flaky_filter(*args, **kwargs):
+            error = next(failures, None)
+            if error is not None:
+                raise error
+            return real_filter(*args, **kwargs)
+
+        with patch.object(Job.objects, 'filter', flaky_filter):
+            self.assertEqual(len(claim(10)), 1)
@@ -0,0 +1,62 @@
+"""
+Async variants of the read-only catalog endpoints.
+
+These are plain Django async views (DRF generic views are sync only) that
+query through the async ORM interface (`acount`, `aget`, `async for`) and
+reuse the DRF serializers and pagination links, so their payloads match
+the sync endpoints. Under ASGI they run on the event loop; the ORM calls
+themselves still hop to Django's database thread, as the 5.1 database
+layer is synchronous.
+"""
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .models import Category, Product
+from .serializer import CategorySerializer, ProductDetailSerializer, ProductListSerializer
+from .views import ProductDetailView, ProductListView
+
+
+def _json(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def _paginate(request, queryset, serializer_class):
+    """Limit/offset pagination matching REST_FRAMEWORK's LimitOffsetPagination output."""
+    drf_request = Request(request)
+    paginator = LimitOffsetPagination()
+    paginator.request = drf_request
+    paginator.limit = paginator.get_limit(drf_request)
+    paginator.offset = paginator.get_offset(drf_request)
+    paginator.count = await queryset.acount()
+    page = [obj async for obj in queryset[paginator.offset:paginator.offset + paginator.limit]]
+    serializer = serializer_class(page, many=True, context={'request': drf_request})
+    return paginator.get_paginated_response(serializer.data).data
+
+
+@require_GET
+async def product_list(request):
+    """GET /async/product/ - async counterpart of ProductListView (without its filters)."""
+    data = await _paginate(request, ProductListView.queryset.all(), ProductListSerializer)
+    return _json(data)
+
+
+@require_GET
+async def product_detail(request, pk):
+    """GET /async/product/<pk> - async counterpart of ProductDetailView (without HTTP caching)."""
+    try:
+        product = await ProductDetailView.queryset.aget(pk=pk)
+    except Product.DoesNotExist:
+        raise Http404
+    serializer = ProductDetailSerializer(product, context={'request': Request(request)})
+    return _json(serializer.data)
+
+
+@require_GET
+async def category_list(request):
+    """GET /async/category/ - async counterpart of CategoryViewSet.list."""
+    data = await _paginate(request, Category.objects.all(), CategorySerializer)
+    return _json(data)
@@ -0,0 +1,55 @@
+import threading
+
+from rest_framework.renderers import JSONRenderer
+
+from .models import CATEGORY_TREE_CACHE_KEY, CacheVersion, Category
+
+
+class CategoryTreeCache:
+    """
+    Process-local cache of the rendered category navigation tree.
+
+    The rendered JSON is stored together with the `CacheVersion` it was built
+    from. Each lookup costs one primary-key query to read the shared version;
+    the tree is rebuilt only when that version has moved, and a lock makes sure
+    concurrent threads of the same worker rebuild it once per change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._content = None
+
+    def get(self):
+        """Return the rendered tree as JSON bytes."""
+        version = CacheVersion.current(CATEGORY_TREE_CACHE_KEY)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._content = JSONRenderer().render(self.build())
+                    self._version = version
+        return self._content
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._content = None
+
+    @staticmethod
+    def build():
+        """Build the nested tree of active categories from a single query."""
+        rows = Category.objects.filter(is_active=True).values('id', 'title', 'slug', 'parent_id')
+        nodes = {
+            row['id']: {'id': row['id'], 'title': row['title'], 'slug': row['slug'], 'children': []}
+            for row in rows
+        }
+        roots = []
+        for row in rows:
+            if row['parent_id'] is None:
+                roots.append(nodes[row['id']])
+            elif row['parent_id'] in nodes:
+                nodes[row['parent_id']]['children'].append(nodes[row['id']])
+        return roots
+
+
+category_tree_cache = CategoryTreeCache()
@@ -0,0 +1,152 @@
+import json
+import threading
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+from .models import FACET_INDEX_CACHE_KEY, CacheVersion, OptionValue, ProductAttributeValue
+
+
+_NO_GROUP = object()
+
+
+def bitmap_to_ids(bitmap):
+    """Return the sorted product ids whose bits are set in `bitmap`."""
+    ids = []
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for byte_index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            ids.append(byte_index * 8 + low.bit_length() - 1)
+            byte ^= low
+    return ids
+
+
+def ids_to_bitmap(ids):
+    """Return the bitmap with the bits of `ids` set, built in one pass over a byte buffer."""
+    if not ids:
+        return 0
+    data = bytearray((max(ids) >> 3) + 1)
+    for product_id in ids:
+        data[product_id >> 3] |= 1 << (product_id & 7)
+    return int.from_bytes(data, 'little')
+
+
+class FacetIndex:
+    """
+    Process-local inverted index from `OptionValue` to the products carrying it.
+
+    Each option value maps to a bitmap (a Python int with bit `product_id` set),
+    so "Color=Red AND Size=L" is a bitwise AND and a facet count is a popcount,
+    with no SQL joins or GROUP BY. Values of the same option group are OR-ed.
+
+    The index is tagged with the shared `CacheVersion` it reflects. Writes made
+    by this process are applied incrementally on commit; a version moved by
+    another process triggers a rebuild from one scan of ProductAttributeValue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+        self._groups = {}
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._postings = {}
+            self._groups = {}
+
+    def _ensure_current(self):
+        version = CacheVersion.current(FACET_INDEX_CACHE_KEY)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._rebuild(version)
+
+    def _rebuild(self, version):
+        groups = dict(OptionValue.objects.values_list('id', 'option_group_id'))
+        # OR-ing into an int copies the whole bitmap per row; collect the ids and build each bitmap once.
+        product_ids = {option_value_id: [] for option_value_id in groups}
+        rows = ProductAttributeValue.objects.values_list('option_value_id', 'product_id').iterator()
+        for option_value_id, product_id in rows:
+            product_ids[option_value_id].append(product_id)
+        self._groups = groups
+        self._postings = {option_value_id: ids_to_bitmap(ids) for option_value_id, ids in product_ids.items()}
+        self._version = version
+
+    def apply(self, option_value_id, product_id, present, version):
+        """
+        Apply a single committed change made at `version`.
+
+        Ignored unless the index is exactly one version behind; any other gap
+        means a change from elsewhere was missed and the next read rebuilds.
+        """
+        with self._lock:
+            if self._version is None or self._version != version - 1 or option_value_id not in self._postings:
+                return
+            if present:
+                self._postings[option_value_id] |= 1 << product_id
+            else:
+                self._postings[option_value_id] &= ~(1 << product_id)
+            self._version = version
+
+    def _selection(self, option_value_ids, exclude_group=_NO_GROUP):
+        """AND across option groups, OR within a group; None means "no constraint"."""
+        by_group = {}
+        for option_value_id in option_value_ids:
+            group_id = self._groups.get(option_value_id)
+            if group_id != exclude_group:
+                by_group.setdefault(group_id, 0)
+                by_group[group_id] |= self._postings.get(option_value_id, 0)
+        result = None
+        for bitmap in by_group.values():
+            result = bitmap if result is None else result & bitmap
+        return result
+
+    def product_ids(self, option_value_ids):
+        """Return the sorted ids of products matching the selected option values."""
+        self._ensure_current()
+        selection = self._selection(option_value_ids)
+        return [] if selection is None else bitmap_to_ids(selection)
+
+    def filter(self, queryset, option_value_ids):
+        """
+        Restrict a Product queryset to the products matching the selected option values.
+
+        On SQLite the ids go as a single JSON parameter read by a `json_each`
+        subquery, so a selection matching most of the catalog does not turn
+        into an IN list with one bound parameter per product. Other backends
+        get a plain `pk__in` list.
+        """
+        ids = self.product_ids(option_value_ids)
+        if connections[queryset.db].vendor != 'sqlite':
+            return queryset.filter(pk__in=ids)
+        return queryset.filter(pk__in=RawSQL('SELECT value FROM json_each(%s)', [json.dumps(ids)]))
+
+    def counts(self, option_value_ids=(), product_ids=None):
+        """
+        Return {option_value_id: product count} for every option value.
+
+        Counts for a group ignore the selections made in that same group, so
+        picking "Red" still shows how many products are "Blue". When
+        `product_ids` is given, only those products are counted, e.g. the
+        active products of the category being listed.
+        """
+        self._ensure_current()
+        universe = None if product_ids is None else ids_to_bitmap(list(product_ids))
+        bases = {}
+        counts = {}
+        for option_value_id, bitmap in self._postings.items():
+            group_id = self._groups[option_value_id]
+            if group_id not in bases:
+                base = self._selection(option_value_ids, exclude_group=group_id)
+                if universe is not None:
+                    base = universe if base is None else base & universe
+                bases[group_id] = base
+            base = bases[group_id]
+            counts[option_value_id] = (bitmap if base is None else bitmap & base).bit_count()
+        return counts
+
+
+facet_index = FacetIndex()
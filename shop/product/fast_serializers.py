@@ -0,0 +1,172 @@
+"""
+Read-only fast path for the hot catalog payloads.
+
+`FastSerializer` introspects a DRF ModelSerializer once and compiles its
+fields into a list of (name, getter, converter) steps over `values()` rows,
+so rendering a product card is a handful of dict lookups instead of a
+serializer instance, field binding and attribute walks per item. Only the
+conversions that actually change a value (decimals, datetimes, file URLs)
+go through the DRF field; the output is the same as the serializer's,
+key order included.
+"""
+from functools import partial
+from operator import itemgetter
+
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+from .models import Category, Product, ProductImage
+from .serializer import ProductDetailSerializer, ProductImageSerializer, ProductListSerializer
+
+
+# Fields whose to_representation() returns database values unchanged.
+IDENTITY_FIELDS = (
+    serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+)
+
+VALUE, URL, HANDLER = 'value', 'url', 'handler'
+
+
+class FastSerializer:
+    """
+    Precompiled read-only equivalent of a ModelSerializer over `values()` rows.
+
+    Fields the rows cannot provide directly (method fields, nested
+    serializers, many-to-many relations) need a handler,
+    `handler(row, request)`, returning the already represented value.
+    `columns` lists the `values()` arguments the plan reads, plus
+    `extra_columns` needed by the handlers.
+    """
+
+    def __init__(self, serializer_class, handlers=None, extra_columns=()):
+        self.serializer_class = serializer_class
+        self.handlers = handlers or {}
+        self.extra_columns = tuple(extra_columns)
+        self._plan = None
+
+    @property
+    def plan(self):
+        # Compiled lazily: building the serializer fields needs the app registry.
+        if self._plan is None:
+            self._plan = self.compile()
+        return self._plan
+
+    @property
+    def columns(self):
+        columns = [source for _, source, kind, _ in self.plan if kind != HANDLER]
+        return tuple(dict.fromkeys(columns + list(self.extra_columns)))
+
+    def compile(self):
+        model = self.serializer_class.Meta.model
+        plan = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if name in self.handlers:
+                plan.append((name, None, HANDLER, self.handlers[name]))
+            elif isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer, ManyRelatedField)):
+                raise TypeError(f'{self.serializer_class.__name__}.{name} needs a handler.')
+            elif isinstance(field, serializers.FileField):
+                plan.append((name, field.source, URL, model._meta.get_field(field.source).storage.url))
+            elif isinstance(field, RelatedField) and field.use_pk_only_optimization():
+                # values() already returns the primary key of a foreign key.
+                plan.append((name, field.source, VALUE, None))
+            elif isinstance(field, IDENTITY_FIELDS):
+                plan.append((name, field.source, VALUE, None))
+            else:
+                plan.append((name, field.source, VALUE, field.to_representation))
+        return plan
+
+    def bind(self, request=None):
+        """Resolve the plan for one request into (name, getter, converter) steps."""
+        absolute = request.build_absolute_uri if request is not None else None
+        steps = []
+        for name, source, kind, func in self.plan:
+            if kind == HANDLER:
+                steps.append((name, partial(func, request=request), None))
+            elif kind == URL:
+                steps.append((name, itemgetter(source), partial(_file_url, func, absolute)))
+            else:
+                steps.append((name, itemgetter(source), func))
+        return steps
+
+    def serialize(self, rows, request=None):
+        steps = self.bind(request)
+        return [_represent(steps, row) for row in rows]
+
+    def serialize_one(self, row, request=None):
+        return _represent(self.bind(request), row)
+
+
+def _represent(steps, row):
+    data = {}
+    for name, getter, convert in steps:
+        value = getter(row)
+        if value is not None and convert is not None:
+            value = convert(value)
+        data[name] = value
+    return data
+
+
+def _file_url(url, absolute, name):
+    if not name:
+        return None
+    return absolute(url(name)) if absolute else url(name)
+
+
+def _srcset(row, request):
+    """Same mapping as ProductImageSerializer.get_srcset()."""
+    url = ProductImage._meta.get_field('image').storage.url
+    srcset = {}
+    for image_format, widths in row['variants'].items():
+        srcset[image_format] = {}
+        for width, name in widths.items():
+            srcset[image_format][width] = request.build_absolute_uri(url(name)) if request else url(name)
+    return srcset
+
+
+product_image_serializer = FastSerializer(
+    ProductImageSerializer, handlers={'srcset': _srcset}, extra_columns=('variants',)
+)
+
+product_card_serializer = FastSerializer(
+    ProductListSerializer, handlers={'main_image': lambda row, request: row['main_image']}, extra_columns=('id',)
+)
+
+product_detail_serializer = FastSerializer(
+    ProductDetailSerializer,
+    handlers={
+        'image': lambda row, request: product_image_serializer.serialize(row['images'], request),
+        'category': lambda row, request: row['categories'],
+    },
+)
+
+
+def serialize_product_cards(rows):
+    """
+    ProductListSerializer output for `values()` rows holding `product_card_serializer.columns`.
+
+    Main images are loaded for all rows with one query. Like the DRF
+    serializer, the nested image is rendered without the request, so its
+    URLs stay relative.
+    """
+    rows = list(rows)
+    main_images = {}
+    images = ProductImage.objects.filter(index=0, product__in=[row['id'] for row in rows])
+    for image in images.values(*product_image_serializer.columns):
+        main_images.setdefault(image['product'], image)
+    steps = product_image_serializer.bind()
+    for row in rows:
+        image = main_images.get(row['id'])
+        row['main_image'] = _represent(steps, image) if image is not None else None
+    return product_card_serializer.serialize(rows)
+
+
+def serialize_product_detail(pk, request=None):
+    """ProductDetailSerializer output for product `pk` from three queries, or None if it does not exist."""
+    row = Product.objects.filter(pk=pk).values(*product_detail_serializer.columns).first()
+    if row is None:
+        return None
+    row['images'] = ProductImage.objects.filter(product=pk).values(*product_image_serializer.columns)
+    row['categories'] = list(Category.objects.filter(products=pk).values_list('title', flat=True))
+    return product_detail_serializer.serialize_one(row, request)
@@ -0,0 +1,16 @@
+from .models import Category
+
+
+def filter_by_category(queryset, slug, include_descendants=False):
+    """
+    Restrict a product queryset to the category `slug`.
+
+    With `include_descendants`, products of every category below it are
+    included too, resolved through the category's materialized path.
+    """
+    if not include_descendants:
+        return queryset.filter(category__slug=slug)
+    category = Category.objects.filter(slug=slug).only('path').first()
+    if category is None:
+        return queryset.none()
+    return queryset.filter(category__in=category.get_descendants(include_self=True)).distinct()
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import os
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+logger = logging.getLogger(__name__)
+
+# Widths (in pixels) of the generated copies; originals are never upscaled.
+VARIANT_WIDTHS = (160, 320, 640, 1280)
+
+# Output format -> (Pillow format, file extension, save options).
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+# Directory of the content-addressed originals shared by every ProductImage.
+BLOB_ROOT = 'products/blobs'
+
+
+def file_content_hash(file):
+    """
+    SHA-256 hex digest of an uploaded file.
+
+    Uses the digest computed by the hashing upload handlers while the file was
+    streamed in, and only reads the file again when there is none.
+    """
+    digest = getattr(file, 'content_hash', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in file.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def blob_name(digest, filename):
+    """Storage name of a content-addressed original: products/blobs/<ab>/<digest>.<ext>."""
+    extension = posixpath.splitext(filename)[1].lower()
+    return posixpath.join(BLOB_ROOT, digest[:2], f'{digest}{extension}')
+
+
+def touch(storage, name):
+    """
+    Set the modification time of a stored file to now.
+
+    Reusing a blob touches it, so `gc_image_blobs` treats it as part of an
+    upload in progress for its grace period. Raises FileNotFoundError if
+    the file is gone; storages without local paths are left as they are.
+    """
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        return
+    os.utime(path)
+
+
+def variant_name(name, width, extension):
+    """Storage name of a variant: products/<id>/images/variants/<stem>_<width>.<ext>."""
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'variants', f'{stem}_{width}.{extension}')
+
+
+def _encode(image, pillow_format, options):
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def generate_variants(name, storage=default_storage):
+    """
+    Write resized WebP and JPEG copies of the stored image `name`.
+
+    Returns the `ProductImage.variants` mapping, {format: {width: name}}.
+    Widths larger than the original are skipped, but the smallest width is
+    always produced. Touches only storage, never the database, so it can run
+    in worker processes.
+    """
+    with storage.open(name, 'rb') as stream:
+        original = ImageOps.exif_transpose(Image.open(stream))
+        original.load()
+
+    widths = [width for width in VARIANT_WIDTHS if width <= original.width] or [VARIANT_WIDTHS[0]]
+    variants = {key: {} for key in VARIANT_FORMATS}
+    for width in widths:
+        resized = original.copy()
+        resized.thumbnail((width, original.height), Image.Resampling.LANCZOS)
+        for key, (pillow_format, extension, options) in VARIANT_FORMATS.items():
+            target = variant_name(name, width, extension)
+            if storage.exists(target):
+                storage.delete(target)
+            variants[key][str(width)] = storage.save(target, ContentFile(_encode(resized, pillow_format, options)))
+    return variants
+
+
+def safe_generate_variants(name, storage=default_storage):
+    """generate_variants() that logs and returns {} for missing or unreadable files."""
+    try:
+        return generate_variants(name, storage)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        logger.warning('Could not generate variants for %s: %s', name, exc)
+        return {}
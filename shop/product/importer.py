@@ -0,0 +1,161 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Category, Product
+
+
+IMPORT_FIELDS = ('title', 'description', 'price', 'price_discount', 'final_price_value',
+                 'stock', 'is_active', 'updated_at')
+
+
+class ImportRowError(ValueError):
+    """Raised for a row that cannot be turned into a product."""
+
+
+def read_csv(stream):
+    """Yield rows from a CSV file; categories are '|' separated slugs."""
+    for row in csv.DictReader(stream):
+        row['categories'] = [slug for slug in (row.get('categories') or '').split('|') if slug]
+        yield row
+
+
+def read_jsonl(stream):
+    """
+    Yield rows from a file with one JSON object per line.
+
+    A line that is not valid JSON, or not an object, is yielded as an
+    ImportRowError naming the line, so it is reported like any other bad
+    row instead of aborting the import.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield ImportRowError(f'line {line_number}: invalid JSON: {exc}')
+            continue
+        if not isinstance(row, dict):
+            yield ImportRowError(f'line {line_number}: expected a JSON object, got {type(row).__name__}')
+            continue
+        yield row
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ('0', 'false', 'no', '')
+
+
+class ProductImporter:
+    """
+    Bulk upsert products from an iterable of row dicts, one chunk at a time.
+
+    Products are matched on `slug` (derived from the title when missing):
+    new slugs are bulk-inserted, known ones bulk-updated. `final_price_value`
+    is computed with the same rule as `Product.save()`, and category links
+    are added through batched inserts into the through table. Only one chunk
+    is held in memory at a time.
+
+    Category columns hold category slugs; unknown slugs are counted and skipped.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.category_ids = dict(Category.objects.values_list('slug', 'id'))
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.unknown_categories = set()
+
+    def build_product(self, row):
+        if isinstance(row, ImportRowError):
+            raise row
+        title = (row.get('title') or '').strip()
+        if not title:
+            raise ImportRowError('title is required')
+        try:
+            price = Decimal(str(row.get('price') or 0))
+            price_discount = Decimal(str(row.get('price_discount') or 0))
+            stock = int(row.get('stock') or 0)
+        except (InvalidOperation, ValueError) as exc:
+            raise ImportRowError(f'invalid number: {exc}') from exc
+        if price < 0 or not 0 <= price_discount <= 100 or stock < 0:
+            raise ImportRowError('price, price_discount or stock out of range')
+        slug = row.get('slug') or slugify(title)
+        if not slug:
+            raise ImportRowError('a slug could not be derived from the title')
+        return Product(
+            title=title,
+            slug=slug,
+            description=row.get('description') or '',
+            price=price,
+            price_discount=price_discount,
+            final_price_value=Product.compute_final_price(price, price_discount),
+            stock=stock,
+            is_active=_to_bool(row.get('is_active', True)),
+        )
+
+    def import_chunk(self, rows, first_row):
+        products = {}
+        categories = {}
+        for number, row in enumerate(rows, start=first_row):
+            try:
+                product = self.build_product(row)
+            except ImportRowError as exc:
+                self.errors.append((number, str(exc)))
+                continue
+            # A later row for the same slug wins.
+            products[product.slug] = product
+            categories[product.slug] = row.get('categories') or []
+
+        with transaction.atomic():
+            existing = dict(Product.objects.filter(slug__in=products).values_list('slug', 'id'))
+            now = timezone.now()
+            to_update = []
+            for slug, pk in existing.items():
+                product = products[slug]
+                product.pk = pk
+                product.updated_at = now
+                to_update.append(product)
+            to_create = [product for slug, product in products.items() if slug not in existing]
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            Product.objects.bulk_update(to_update, IMPORT_FIELDS, batch_size=self.batch_size)
+            self._link_categories(products, categories)
+
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+    def _link_categories(self, products, categories):
+        Through = Product.category.through
+        links = []
+        for slug, category_slugs in categories.items():
+            for category_slug in category_slugs:
+                category_id = self.category_ids.get(category_slug)
+                if category_id is None:
+                    self.unknown_categories.add(category_slug)
+                    continue
+                links.append(Through(product_id=products[slug].pk, category_id=category_id))
+        Through.objects.bulk_create(links, batch_size=self.batch_size, ignore_conflicts=True)
+
+    def run(self, rows, progress=None):
+        """Import every row; `progress(processed)` is called after each chunk."""
+        processed = 0
+        for chunk in chunked(rows, self.batch_size):
+            self.import_chunk(chunk, first_row=processed + 1)
+            processed += len(chunk)
+            if progress:
+                progress(processed)
+        return processed
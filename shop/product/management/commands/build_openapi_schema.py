@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from config.schema import build_schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema once and write it to SCHEMA_ROOT for the documentation views to serve'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Directory to write to instead of SCHEMA_ROOT')
+
+    def handle(self, *args, **options):
+        root = options['output'] or settings.SCHEMA_ROOT
+        fingerprint = build_schema(root)
+        self.stdout.write(self.style.SUCCESS(f'Wrote the OpenAPI schema ({fingerprint[:12]}) to {root}'))
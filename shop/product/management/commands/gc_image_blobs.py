@@ -0,0 +1,60 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from product.images import BLOB_ROOT
+from product.models import ProductImage
+
+
+def walk(storage, directory):
+    """Yield every file name below `directory` in `storage`."""
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from walk(storage, posixpath.join(directory, name))
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed image blobs and variants that no ProductImage references'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-minutes',
+            type=int,
+            default=60,
+            help='Keep files younger than this, they may belong to an upload in progress (default: 60)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only list what would be deleted')
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        referenced = set()
+        for name, variants in ProductImage.objects.values_list('image', 'variants').iterator():
+            referenced.add(name)
+            for widths in variants.values():
+                referenced.update(widths.values())
+
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        deleted = freed = 0
+        for name in walk(storage, BLOB_ROOT):
+            if name in referenced or storage.get_modified_time(name) > cutoff:
+                continue
+            # `referenced` was read before the walk; an upload may have reused the blob since.
+            if ProductImage.objects.filter(image=name).exists():
+                continue
+            size = storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(f'Would delete {name}')
+            else:
+                storage.delete(name)
+            deleted += 1
+            freed += size
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {deleted} files ({freed / 1024 / 1024:.1f} MiB)'))
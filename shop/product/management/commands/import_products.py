@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.importer import ProductImporter, read_csv, read_jsonl
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+class Command(BaseCommand):
+    help = 'Stream products from a CSV or JSONL file into the catalog in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import')
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='Input format (defaults to the file extension)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows written per bulk statement (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in READERS:
+            raise CommandError(f'Unknown format "{file_format}", use --format.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        importer = ProductImporter(batch_size=options['batch_size'])
+        started = time.perf_counter()
+
+        def progress(processed):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{processed} rows, {processed / elapsed:.0f} rows/sec')
+
+        try:
+            stream = open(path, newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(str(exc)) from exc
+        with stream:
+            processed = importer.run(READERS[file_format](stream), progress=progress)
+
+        elapsed = time.perf_counter() - started
+        for number, message in importer.errors:
+            self.stderr.write(f'Row {number}: {message}')
+        if importer.unknown_categories:
+            self.stderr.write(f'Unknown categories skipped: {", ".join(sorted(importer.unknown_categories))}')
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {processed} rows in {elapsed:.2f}s ({rate:.0f} rows/sec): '
+            f'{importer.created} created, {importer.updated} updated, {len(importer.errors)} skipped'
+        ))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from config.dbrouter import refresh_replicas
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary database into the SQLite files standing in for read replicas'
+
+    def handle(self, *args, **options):
+        if not settings.READ_REPLICAS:
+            raise CommandError('No replicas configured; set DATABASE_REPLICAS.')
+        aliases = refresh_replicas()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {", ".join(aliases)}'))
@@ -0,0 +1,68 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from product.images import safe_generate_variants
+from product.models import ProductImage
+from product.signals import touch_products
+
+
+def _init_worker():
+    # Needed where workers are spawned rather than forked.
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Regenerate resized variants for existing product images in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Number of worker processes (default: CPU count)'
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only process images that have no variants yet'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Images dispatched and saved per batch (default: 200)'
+        )
+
+    def handle(self, *args, **options):
+        queryset = ProductImage.objects.order_by('pk')
+        if options['missing_only']:
+            queryset = queryset.filter(variants={})
+        batch_size = options['batch_size']
+
+        # Worker processes must not share the parent's database connections.
+        connections.close_all()
+        started = time.perf_counter()
+        processed = failed = 0
+        last_pk = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as executor:
+            while batch := list(queryset.filter(pk__gt=last_pk).only('pk', 'product_id', 'image')[:batch_size]):
+                names = [image.image.name for image in batch]
+                for image, variants in zip(batch, executor.map(safe_generate_variants, names)):
+                    image.variants = variants
+                    failed += not variants
+                ProductImage.objects.bulk_update(batch, ['variants'])
+                # Cached product payloads include the srcset.
+                touch_products({image.product_id for image in batch})
+                processed += len(batch)
+                last_pk = batch[-1].pk
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{processed} images, {processed / elapsed:.1f} images/sec')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} images in {time.perf_counter() - started:.2f}s ({failed} failed)'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from product.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Release expired stock reservations whose expiry job did not run (e.g. while no worker was up)'
+
+    def handle(self, *args, **options):
+        released = release_expired()
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations'))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.pricing import reprice_products
+from product.serializer import ProductRepriceSerializer
+
+
+class Command(BaseCommand):
+    help = 'Set discounts or change prices for a set of products in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', help='Comma separated product ids')
+        parser.add_argument('--category', help='Category slug')
+        parser.add_argument(
+            '--include-descendants',
+            action='store_true',
+            help='Include products of every category below --category'
+        )
+        parser.add_argument('--discount', help='New discount percentage (0-100)')
+        parser.add_argument('--price-change', help='Relative price change in percent, e.g. -10')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        data = {'include_descendants': options['include_descendants']}
+        if options['ids']:
+            data['ids'] = [pk for pk in options['ids'].split(',') if pk]
+        if options['category']:
+            data['category'] = options['category']
+        if options['discount'] is not None:
+            data['price_discount'] = options['discount']
+        if options['price_change'] is not None:
+            data['price_change_percent'] = options['price_change']
+
+        serializer = ProductRepriceSerializer(data=data)
+        if not serializer.is_valid():
+            raise CommandError(serializer.errors)
+
+        started = time.perf_counter()
+        updated = reprice_products(
+            serializer.get_products(),
+            price_discount=serializer.validated_data.get('price_discount'),
+            price_change_percent=serializer.validated_data.get('price_change_percent'),
+            batch_size=options['batch_size'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Repriced {updated} products in {elapsed:.2f}s'))
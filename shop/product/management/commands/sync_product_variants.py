@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from product.variants import sync_all_variants
+
+
+class Command(BaseCommand):
+    help = 'Generate missing product variants and deactivate those whose options are gone'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Products handled per transaction')
+
+    def handle(self, *args, **options):
+        created, reactivated, deactivated = sync_all_variants(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created}, reactivated {reactivated} and deactivated {deactivated} variants'
+        ))
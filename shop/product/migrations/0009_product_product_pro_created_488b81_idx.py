@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_optionattribute_productattributevalue_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at', '-id'], name='product_pro_created_488b81_idx'),
+        ),
+    ]
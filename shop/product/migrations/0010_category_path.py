@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:15
+
+from django.db import migrations, models
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model('product', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def path_for(pk):
+        if pk not in paths:
+            parent_id = parents[pk]
+            prefix = path_for(parent_id) if parent_id else '/'
+            paths[pk] = f'{prefix}{pk}/'
+        return paths[pk]
+
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.path = path_for(category.pk)
+    Category.objects.bulk_update(categories, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_product_product_pro_created_488b81_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, editable=False, help_text='Materialized path of ancestor ids, maintained automatically', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='product_cat_path_572626_idx'),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
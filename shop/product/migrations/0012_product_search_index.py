@@ -0,0 +1,72 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:17
+
+from django.db import migrations
+
+
+# External-content FTS5 table over product_product, kept in sync by triggers so
+# that every write path (save, bulk_create, queryset.update, raw SQL) is covered.
+FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE product_product_fts USING fts5(
+        title,
+        description,
+        content='product_product',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER product_product_fts_ai AFTER INSERT ON product_product BEGIN
+        INSERT INTO product_product_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER product_product_fts_ad AFTER DELETE ON product_product BEGIN
+        INSERT INTO product_product_fts(product_product_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER product_product_fts_au AFTER UPDATE OF title, description ON product_product BEGIN
+        INSERT INTO product_product_fts(product_product_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO product_product_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO product_product_fts(product_product_fts) VALUES ('rebuild')",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS product_product_fts_au",
+    "DROP TRIGGER IF EXISTS product_product_fts_ad",
+    "DROP TRIGGER IF EXISTS product_product_fts_ai",
+    "DROP TABLE IF EXISTS product_product_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in FORWARD_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in REVERSE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0011_cacheversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
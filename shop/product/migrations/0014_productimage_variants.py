@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0013_cacheversion_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Generated resized copies, e.g. {"webp": {"320": "<file name>"}}'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0014_productimage_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the image content', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(fields=['content_hash'], name='product_pro_content_4515d3_idx'),
+        ),
+    ]
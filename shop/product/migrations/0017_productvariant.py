@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0016_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('combination_key', models.CharField(editable=False, help_text='Sorted option value ids joined by "-"', max_length=255, verbose_name='Combination Key')),
+                ('sku', models.CharField(max_length=100, unique=True, verbose_name='SKU')),
+                ('stock', models.PositiveIntegerField(default=0, verbose_name='Stock')),
+                ('price_delta', models.DecimalField(decimal_places=2, default=0, help_text='Added to the product price for this variant', max_digits=10, verbose_name='Price Delta')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Is Active')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('option_values', models.ManyToManyField(related_name='variants', to='product.optionvalue', verbose_name='Option Values')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='product.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Product Variant',
+                'verbose_name_plural': 'Product Variants',
+                'indexes': [models.Index(fields=['combination_key'], name='product_pro_combina_b0aecf_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'combination_key'), name='product_variant_unique_combination')],
+            },
+        ),
+    ]
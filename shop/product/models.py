@@ -1,7 +1,117 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from django.utils.text import slugify
 
+from .images import blob_name, file_content_hash, touch
+
+
+CATEGORY_TREE_CACHE_KEY = 'category_tree'
+FACET_INDEX_CACHE_KEY = 'facet_index'
+
+
+class CacheVersion(models.Model):
+    """
+    A shared, monotonically increasing version counter for a cached resource.
+
+    Writers bump the counter in the same transaction as the change; every worker
+    compares it with the version of its process-local copy and rebuilds on mismatch.
+
+    Attributes:
+        key (CharField): Name of the cached resource (e.g. "category_tree").
+        version (PositiveBigIntegerField): Incremented on every change.
+        updated_at (DateTimeField): Time of the last change.
+    """
+
+    key = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Cache Key'
+    )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Version'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Updated At'
+    )
+
+    def __str__(self):
+        return f'{self.key} v{self.version}'
+
+    @classmethod
+    def current(cls, key):
+        """Return the current version of `key` (0 if it was never bumped)."""
+        return cls.objects.filter(key=key).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, key):
+        """Increment the version of `key` and return the new version."""
+        with transaction.atomic():
+            cls.objects.get_or_create(key=key)
+            cls.objects.filter(key=key).update(version=F('version') + 1, updated_at=timezone.now())
+            return cls.current(key)
+
+    @classmethod
+    def state(cls, key):
+        """Return (version, updated_at) of `key`, or (0, None) if it was never bumped."""
+        return cls.objects.filter(key=key).values_list('version', 'updated_at').first() or (0, None)
+
+    class Meta:
+        verbose_name = 'Cache Version'
+        verbose_name_plural = 'Cache Versions'
+
+
+class CategoryQuerySet(models.QuerySet):
+    """
+    Category queryset whose bulk writes keep the tree consistent.
+
+    `update()`, `bulk_create()`, `bulk_update()` and `delete()` bypass
+    `Category.save()`/`delete()`, so they rebuild the materialized paths
+    when the shape of the tree may have changed and bump the category tree
+    cache version, in the same transaction as the write.
+    """
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db):
+            rows = super().update(**kwargs)
+            if rows:
+                self.model.tree_changed(rebuild_paths='parent' in kwargs or 'parent_id' in kwargs)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        for obj in objs:
+            if not obj.slug:
+                obj.slug = slugify(obj.title)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            if created:
+                self.model.tree_changed(rebuild_paths=True)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            # Through the plain queryset: its per-batch update() calls must not each bump the version.
+            rows = self.model._base_manager.using(self.db).bulk_update(objs, fields, *args, **kwargs)
+            if rows:
+                self.model.tree_changed(rebuild_paths='parent' in fields or 'parent_id' in fields)
+        return rows
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            result = super().delete()
+            if result[0]:
+                # Children of deleted categories were detached (SET_NULL) and need new paths.
+                self.model.tree_changed(rebuild_paths=True)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
 
 class Category(models.Model):
     """
@@ -9,6 +119,11 @@ class Category(models.Model):
 
     Each category can have a parent category, allowing for hierarchical structures.
     If a parent category is deleted, the parent field of its children will be set to NULL.
+
+    The tree is also stored as a materialized path (e.g. "/1/4/9/"), kept in sync
+    on save and delete, so subtree and ancestor lookups are a single indexed query.
+    Bulk writes through `Category.objects` keep it in sync as well (see
+    CategoryQuerySet); internal path upkeep goes through `_base_manager`.
     """
     title = models.CharField(
         max_length=50, 
@@ -39,6 +154,14 @@ class Category(models.Model):
         default=True,
         help_text='Controls whether the category is visible in the storefront'
     )
+    path = models.CharField(
+        max_length=255,
+        editable=False,
+        blank=True,
+        help_text='Materialized path of ancestor ids, maintained automatically'
+    )
+
+    objects = CategoryQuerySet.as_manager()
     
     def __str__(self):
         return self.title
@@ -46,7 +169,98 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if self.pk:
+                # Descendants are located by the stored path, not a possibly stale in-memory one.
+                self.path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first() or ''
+            super().save(*args, **kwargs)
+            self._sync_path()
+            CacheVersion.bump(CATEGORY_TREE_CACHE_KEY)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            children = list(self.children.all())
+            result = super().delete(*args, **kwargs)
+            # The database has already detached the children (SET_NULL);
+            # re-root each of their subtrees.
+            for child in children:
+                child.parent = None
+                child._sync_path()
+            CacheVersion.bump(CATEGORY_TREE_CACHE_KEY)
+        return result
+
+    def _build_path(self):
+        if self.parent_id is None:
+            return f'/{self.pk}/'
+        parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+        if self.path and parent_path.startswith(self.path):
+            raise ValueError('A category cannot be moved under itself or one of its descendants.')
+        return f'{parent_path}{self.pk}/'
+
+    def _sync_path(self):
+        """Recompute this category's path and rewrite the paths of its descendants."""
+        old_path = self.path
+        new_path = self._build_path()
+        if old_path == new_path:
+            return
+        Category._base_manager.filter(pk=self.pk).update(path=new_path)
+        if old_path:
+            Category.subtree_filter(old_path, Category._base_manager).exclude(pk=self.pk).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1))
+            )
+        self.path = new_path
+
+    @staticmethod
+    def subtree_filter(path, manager=None):
+        """
+        Return a queryset of every category whose path starts with `path`.
+
+        Expressed as a range rather than LIKE so the path index is used on
+        every backend: '0' is the character right after '/'.
+        """
+        manager = Category.objects if manager is None else manager
+        return manager.filter(path__gte=path, path__lt=path[:-1] + '0')
+
+    @classmethod
+    def tree_changed(cls, rebuild_paths=False):
+        """Record a write that bypassed save()/delete(): optionally rebuild every path, then bump the version."""
+        if rebuild_paths:
+            cls.rebuild_paths()
+        CacheVersion.bump(CATEGORY_TREE_CACHE_KEY)
+
+    @classmethod
+    def rebuild_paths(cls):
+        """Recompute every materialized path from the parent links and write the ones that changed."""
+        rows = cls._base_manager.values_list('id', 'parent_id', 'path')
+        parents = {pk: parent_id for pk, parent_id, _ in rows}
+        stored = {pk: path for pk, _, path in rows}
+        paths = {}
+        for pk in parents:
+            chain, seen, node = [], set(), pk
+            while node is not None and node not in paths:
+                if node in seen:
+                    raise ValueError('A category cannot be moved under itself or one of its descendants.')
+                seen.add(node)
+                chain.append(node)
+                node = parents.get(node)
+            path = '/' if node is None else paths[node]
+            for node in reversed(chain):
+                path = paths[node] = f'{path}{node}/'
+        changed = [cls(pk=pk, path=path) for pk, path in paths.items() if stored[pk] != path]
+        cls._base_manager.bulk_update(changed, ['path'], batch_size=500)
+
+    def get_descendants(self, include_self=False):
+        """Return all categories below this one in a single query."""
+        queryset = Category.subtree_filter(self.path)
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
+
+    def get_ancestors(self):
+        """Return the ancestors of this category from the root down (breadcrumbs)."""
+        ancestor_ids = [int(pk) for pk in self.path.strip('/').split('/')[:-1]]
+        ancestors = Category.objects.in_bulk(ancestor_ids)
+        return [ancestors[pk] for pk in ancestor_ids if pk in ancestors]
     
     class Meta:
         verbose_name = "Category"
@@ -55,6 +269,7 @@ class Category(models.Model):
         indexes = [
             models.Index(fields=['slug']),
             models.Index(fields=['parent']),
+            models.Index(fields=['path']),
         ]
 
 
@@ -144,12 +359,17 @@ class Product(models.Model):
         verbose_name='Updated At'
     )
     
+    @staticmethod
+    def compute_final_price(price, price_discount):
+        """Apply a discount percentage to a price; shared by save() and bulk writers."""
+        if price_discount:
+            return price - (price * price_discount/100)
+        return price
+
     @property
     def _final_price(self):
         """Calculate the final price after applying the discount."""
-        if self.price_discount:
-            return self.price - (self.price * self.price_discount/100)
-        return self.price
+        return self.compute_final_price(self.price, self.price_discount)
 
     @property
     def has_stock(self):
@@ -173,6 +393,7 @@ class Product(models.Model):
             models.Index(fields=['slug']),
             models.Index(fields=['is_active']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['-created_at', '-id']),
         ]
 
 
@@ -336,6 +557,100 @@ class ProductAttributeValue(models.Model):
     )
 
 
+class ProductVariant(models.Model):
+    """
+    A concrete, purchasable combination of a product's option values (a SKU).
+
+    Variants are generated by `product.variants.sync_variants()` from the
+    cartesian product of the option values a product is offered in, one
+    axis per option group linked to it. They are never edited by hand:
+    combinations that disappear are deactivated, keeping their stock and
+    price delta for when they come back.
+
+    Attributes:
+        product (ForeignKey): The product this variant belongs to.
+        option_values (ManyToManyField): One option value per option group of the product.
+        combination_key (CharField): The sorted option value ids joined by "-", e.g. "3-7-12";
+            unique per product and indexed for lookups by combination.
+        sku (CharField): Unique stock keeping unit code.
+        stock (PositiveIntegerField): Units of this variant in stock.
+        price_delta (DecimalField): Added to the product price for this variant.
+        is_active (BooleanField): False once the combination is no longer offered.
+        created_at (DateTimeField): When the variant was generated.
+        updated_at (DateTimeField): When the variant was last changed.
+    """
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='variants',
+        verbose_name='Product'
+    )
+    option_values = models.ManyToManyField(
+        OptionValue,
+        related_name='variants',
+        verbose_name='Option Values'
+    )
+    combination_key = models.CharField(
+        max_length=255,
+        editable=False,
+        verbose_name='Combination Key',
+        help_text='Sorted option value ids joined by "-"'
+    )
+    sku = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='SKU'
+    )
+    stock = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Stock'
+    )
+    price_delta = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        verbose_name='Price Delta',
+        help_text='Added to the product price for this variant'
+    )
+    is_active = models.BooleanField(
+        default=True,
+        verbose_name='Is Active'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Created At'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Updated At'
+    )
+
+    def __str__(self):
+        return self.sku
+
+    @staticmethod
+    def make_combination_key(option_value_ids):
+        return '-'.join(str(pk) for pk in sorted(set(int(pk) for pk in option_value_ids)))
+
+    @classmethod
+    def lookup(cls, product_id, option_value_ids):
+        """Return the active variant of `product_id` with exactly these option values, or None."""
+        return cls.objects.filter(
+            product_id=product_id, combination_key=cls.make_combination_key(option_value_ids), is_active=True
+        ).first()
+
+    class Meta:
+        verbose_name = 'Product Variant'
+        verbose_name_plural = 'Product Variants'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'combination_key'], name='product_variant_unique_combination'),
+        ]
+        indexes = [
+            models.Index(fields=['combination_key']),
+        ]
+
+
 def product_image_path(instance, filename):
     """Generate a path for storing product images."""
     return f'products/{instance.product.id}/images/{filename}'
@@ -360,6 +675,8 @@ class ProductImage(models.Model):
         is_active (BooleanField): Controls whether the image is visible in storefront
         index (PositiveIntegerField): Determines display order in product galleries
         alt_text (CharField): Alternative text for accessibility
+        variants (JSONField): Storage names of the resized copies, by format and width
+        content_hash (CharField): SHA-256 of the file; identical uploads share one stored blob
     """
     
     product = models.ForeignKey(
@@ -390,13 +707,141 @@ class ProductImage(models.Model):
         verbose_name='Display Order',
         help_text='Determines sorting order in image galleries (lower numbers show first)'
     )
+    variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text='Generated resized copies, e.g. {"webp": {"320": "<file name>"}}'
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        help_text='SHA-256 of the image content'
+    )
 
     class Meta:
         verbose_name = 'Product Image'
         verbose_name_plural = 'Product Images'
         ordering = ('index',)
-     
+        indexes = [
+            models.Index(fields=['content_hash']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.image and not self.image._committed:
+            self._store_content_addressed()
+        return super().save(*args, **kwargs)
+
+    def _store_content_addressed(self):
+        """Point `image` at the blob for its content, writing the file only if it is new."""
+        upload = self.image.file
+        self.content_hash = file_content_hash(upload)
+        name = blob_name(self.content_hash, self.image.name)
+        storage = self.image.storage
+        reused = storage.exists(name)
+        if reused:
+            try:
+                # Keeps a concurrent gc_image_blobs from deleting an unreferenced blob we are reusing.
+                touch(storage, name)
+            except FileNotFoundError:
+                reused = False
+        if not reused:
+            name = storage.save(name, upload)
+        self.image.name = name
+        self.image._committed = True
 
     def __str__(self):
         return f"Image {self.id} for {self.product.title} ({'active' if self.is_active else 'inactive'})"
 
+
+
+class Reservation(models.Model):
+    """
+    A hold on product stock, e.g. for the contents of a cart during checkout.
+
+    Reserving decrements `Product.stock` right away; releasing the
+    reservation, or letting it expire, puts the stock back.
+
+    Attributes:
+        user (ForeignKey): The customer holding the reservation, if any.
+        status (CharField): Active until it is released or expires.
+        expires_at (DateTimeField): When an active reservation is released automatically.
+        created_at (DateTimeField): When the stock was reserved.
+    """
+
+    ACTIVE = 'active'
+    RELEASED = 'released'
+    EXPIRED = 'expired'
+    STATUSES = (
+        (ACTIVE, 'Active'),
+        (RELEASED, 'Released'),
+        (EXPIRED, 'Expired'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='reservations',
+        verbose_name='User'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=ACTIVE,
+        verbose_name='Status'
+    )
+    expires_at = models.DateTimeField(
+        verbose_name='Expires At'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Created At'
+    )
+
+    def __str__(self):
+        return f'Reservation {self.pk} ({self.status})'
+
+    class Meta:
+        verbose_name = 'Reservation'
+        verbose_name_plural = 'Reservations'
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+
+class ReservationItem(models.Model):
+    """
+    The quantity of one product held by a reservation.
+
+    Attributes:
+        reservation (ForeignKey): The reservation this item belongs to.
+        product (ForeignKey): The reserved product.
+        quantity (PositiveIntegerField): Number of units taken from the product's stock.
+    """
+
+    reservation = models.ForeignKey(
+        Reservation,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name='Reservation'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='reservation_items',
+        verbose_name='Product'
+    )
+    quantity = models.PositiveIntegerField(
+        validators=[MinValueValidator(1)],
+        verbose_name='Quantity'
+    )
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id}'
+
+    class Meta:
+        verbose_name = 'Reservation Item'
+        verbose_name_plural = 'Reservation Items'
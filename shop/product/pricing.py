@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+from django.db.models.functions import Cast, Mod, Round
+from django.db.models.lookups import Exact, GreaterThan
+from django.utils import timezone
+
+from .models import Product
+
+
+MONEY_FIELD = DecimalField(max_digits=10, decimal_places=2)
+
+
+def _to_hundredths(expression):
+    """A 2-decimal-place value as an exact integer number of hundredths."""
+    return Cast(Round(expression * Value(100)), IntegerField())
+
+
+def _div_round_half_even(numerator, divisor):
+    """
+    Integer division of a non-negative integer expression, rounded half to even.
+
+    This is the rounding Django applies when it quantizes a Decimal on save,
+    so set-based updates store exactly what Product.save() would.
+    """
+    quotient = Cast(numerator / Value(divisor), IntegerField())
+    remainder = Mod(numerator, Value(divisor), output_field=IntegerField())
+    half = divisor // 2
+    return quotient + Case(
+        When(GreaterThan(remainder, half), then=Value(1)),
+        When(Exact(remainder, half), then=Mod(quotient, Value(2), output_field=IntegerField())),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _from_cents(cents):
+    return Cast(cents / Value(100.0), MONEY_FIELD)
+
+
+def final_price_expression(price, price_discount):
+    """
+    SQL equivalent of Product.compute_final_price() followed by the 2dp rounding on save.
+
+    With price P and discount D both in hundredths, the exact final price in
+    millionths is P*10000 - P*D, which is then rounded to cents.
+    """
+    price_cents = _to_hundredths(price)
+    discount_bp = _to_hundredths(price_discount)
+    millionths = price_cents * Value(10000) - price_cents * discount_bp
+    return _from_cents(_div_round_half_even(millionths, 10000))
+
+
+def scaled_price_expression(price, change_percent):
+    """`price` changed by `change_percent` (e.g. -20 for 20% off), rounded to cents like save()."""
+    price_cents = _to_hundredths(price)
+    factor_bp = int((Decimal(100) + change_percent) * 100)
+    return _from_cents(_div_round_half_even(price_cents * Value(factor_bp), 10000))
+
+
+def reprice_products(queryset, price_discount=None, price_change_percent=None, batch_size=1000):
+    """
+    Apply a discount and/or a relative price change to every product in `queryset`.
+
+    Each batch of ids is a single UPDATE that sets the new price and discount
+    and recomputes `final_price_value` from them in SQL; no rows are loaded
+    into Python. Returns the number of products updated.
+    """
+    price = F('price')
+    discount = F('price_discount')
+    changes = {}
+    if price_change_percent is not None:
+        price = changes['price'] = scaled_price_expression(price, Decimal(price_change_percent))
+    if price_discount is not None:
+        discount = changes['price_discount'] = Value(Decimal(price_discount), output_field=MONEY_FIELD)
+    changes['final_price_value'] = final_price_expression(price, discount)
+
+    updated = 0
+    last_pk = 0
+    ids = queryset.order_by('pk').values_list('pk', flat=True).distinct()
+    # Walk the matching ids by primary key so each batch is a fresh indexed
+    # query and rows changed by a previous batch are never revisited.
+    while batch := list(ids.filter(pk__gt=last_pk)[:batch_size]):
+        with transaction.atomic():
+            updated += Product.objects.filter(pk__in=batch).update(updated_at=timezone.now(), **changes)
+        last_pk = batch[-1]
+    return updated
@@ -0,0 +1,116 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from jobs.queue import enqueue
+
+from .models import Product, Reservation, ReservationItem
+
+
+class OutOfStock(Exception):
+    """Raised when a product cannot cover the requested quantity; nothing is reserved."""
+
+    def __init__(self, product_id, quantity):
+        super().__init__(f'Product {product_id} does not have {quantity} units in stock.')
+        self.product_id = product_id
+        self.quantity = quantity
+
+
+def merge_items(items):
+    """Sum (product_id, quantity) pairs per product, in product id order."""
+    quantities = {}
+    for product_id, quantity in items:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return sorted(quantities.items())
+
+
+def _retry_locked(func, attempts=50):
+    """
+    Call `func`, retrying when SQLite reports the database or a table as locked.
+
+    Under write contention SQLite can refuse a transaction outright instead of
+    waiting for the lock; the whole transaction is retried after a short,
+    jittered pause.
+    """
+    for attempt in range(attempts):
+        try:
+            return func()
+        except OperationalError as exc:
+            if 'locked' not in str(exc) or attempt == attempts - 1:
+                raise
+            time.sleep(random.uniform(0.001, 0.005) * min(attempt + 1, 10))
+
+
+def reserve(items, user=None, ttl=None):
+    """
+    Reserve stock for `items`, (product_id, quantity) pairs, in one transaction.
+
+    Each product's stock is decremented with a single conditional UPDATE
+    (`stock >= quantity`), so concurrent reservations can never take more
+    than is in stock and no row is read and written back. If any product
+    falls short, OutOfStock is raised and nothing is reserved. Products are
+    updated in id order so concurrent carts lock rows in the same order.
+
+    The reservation is released automatically after `ttl` seconds
+    (RESERVATION_TTL by default) by a queued job.
+    """
+    ttl = settings.RESERVATION_TTL if ttl is None else ttl
+    items = merge_items(items)
+
+    def attempt():
+        with transaction.atomic():
+            now = timezone.now()
+            for product_id, quantity in items:
+                updated = Product.objects.filter(pk=product_id, is_active=True, stock__gte=quantity).update(
+                    stock=F('stock') - quantity, updated_at=now
+                )
+                if not updated:
+                    raise OutOfStock(product_id, quantity)
+            reservation = Reservation.objects.create(user=user, expires_at=now + timedelta(seconds=ttl))
+            ReservationItem.objects.bulk_create(
+                ReservationItem(reservation=reservation, product_id=product_id, quantity=quantity)
+                for product_id, quantity in items
+            )
+            enqueue('product.release_reservation', {'reservation_id': reservation.pk},
+                    key=f'reservation:{reservation.pk}', delay=ttl)
+            return reservation
+
+    return _retry_locked(attempt)
+
+
+def release(reservation_id, status=Reservation.RELEASED, expired_only=False):
+    """
+    Return the stock of an active reservation and mark it `status`.
+
+    The status change is a conditional UPDATE, so a reservation released
+    concurrently by its owner and by the expiry job gives its stock back
+    only once. Returns whether this call released it.
+    """
+    def attempt():
+        with transaction.atomic():
+            now = timezone.now()
+            active = Reservation.objects.filter(pk=reservation_id, status=Reservation.ACTIVE)
+            if expired_only:
+                active = active.filter(expires_at__lte=now)
+            if not active.update(status=status):
+                return False
+            items = ReservationItem.objects.filter(reservation_id=reservation_id).order_by('product_id')
+            for product_id, quantity in items.values_list('product_id', 'quantity'):
+                Product.objects.filter(pk=product_id).update(stock=F('stock') + quantity, updated_at=now)
+            return True
+
+    return _retry_locked(attempt)
+
+
+def release_expired():
+    """Release every active reservation past its expiry; returns how many were released."""
+    expired = Reservation.objects.filter(status=Reservation.ACTIVE, expires_at__lte=timezone.now())
+    return sum(
+        release(pk, status=Reservation.EXPIRED, expired_only=True)
+        for pk in expired.values_list('pk', flat=True)
+    )
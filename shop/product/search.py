@@ -0,0 +1,82 @@
+import re
+
+from django.db import connection
+from django.utils.html import escape
+
+
+SEARCH_TABLE = 'product_product_fts'
+
+# Column weights for bm25(): a hit in the title outweighs one in the description.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+SNIPPET_TOKENS = 16
+
+# FTS5 wraps matches in these control characters; the text is HTML-escaped
+# before they are swapped for HIGHLIGHT_START/HIGHLIGHT_END.
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+
+
+def build_match_query(text):
+    """
+    Turn free user input into a safe FTS5 MATCH expression.
+
+    Every word is quoted (so FTS5 operators in the input are treated as text)
+    and made a prefix query; the words are implicitly AND-ed.
+    """
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def render_highlight(text):
+    """Return FTS5 highlight()/snippet() output as escaped HTML with the matches in <mark> tags."""
+    if text is None:
+        return ''
+    return escape(text).replace(_MATCH_START, HIGHLIGHT_START).replace(_MATCH_END, HIGHLIGHT_END)
+
+
+def search_products(text, limit, offset=0):
+    """
+    Run a ranked full-text search over product titles and descriptions.
+
+    Returns a list of dicts with the product id, its bm25 rank (lower is
+    better), the highlighted title and a highlighted description snippet.
+    Both are HTML-escaped, with only the <mark> tags around matches left as
+    markup, so they are safe to insert into a page as is.
+    """
+    match = build_match_query(text)
+    if not match:
+        return []
+    sql = f"""
+        SELECT rowid,
+               bm25({SEARCH_TABLE}, %s, %s) AS rank,
+               highlight({SEARCH_TABLE}, 0, %s, %s),
+               snippet({SEARCH_TABLE}, 1, %s, %s, '…', %s)
+        FROM {SEARCH_TABLE}
+        WHERE {SEARCH_TABLE} MATCH %s
+        ORDER BY rank
+        LIMIT %s OFFSET %s
+    """
+    params = [
+        TITLE_WEIGHT, DESCRIPTION_WEIGHT,
+        _MATCH_START, _MATCH_END,
+        _MATCH_START, _MATCH_END, SNIPPET_TOKENS,
+        match, limit, offset,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            {'id': row[0], 'rank': row[1], 'title_highlight': render_highlight(row[2]),
+             'snippet': render_highlight(row[3])}
+            for row in cursor.fetchall()
+        ]
+
+
+def rebuild_search_index():
+    """Rebuild the whole index from product_product in one bulk pass."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
@@ -1,8 +1,14 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 
+from .filters import filter_by_category
 from .models import (Category, OptionAttribute,
                       Product,
                       ProductImage,
+                      ProductVariant,
+                      Reservation,
+                      ReservationItem,
                       OptionGroup,
                       OptionValue,
                       )
@@ -13,6 +19,11 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = '__all__'
 
+    def validate_parent(self, value):
+        if value and self.instance and value.path.startswith(self.instance.path):
+            raise serializers.ValidationError("A category cannot be moved under itself or one of its descendants.")
+        return value
+
 
 
 class ProductListSerializer(serializers.ModelSerializer):
@@ -22,6 +33,12 @@ class ProductListSerializer(serializers.ModelSerializer):
         fields = ('title', 'final_price_value', 'main_image')
 
     def get_main_image(self, obj:Product):
+        # ProductListView prefetches the index=0 image for the whole page
+        # into `main_images`; fall back to a query for callers that don't.
+        if hasattr(obj, 'main_images'):
+            if not obj.main_images:
+                return None
+            return ProductImageSerializer(obj.main_images[0]).data
         try:
             main_image = obj.product_images.get(index=0)
             return ProductImageSerializer(main_image).data
@@ -30,10 +47,42 @@ class ProductListSerializer(serializers.ModelSerializer):
     
 
 
+class ProductSearchSerializer(ProductListSerializer):
+    """
+    Product card plus the search annotations attached by ProductSearchView.
+
+    `title_highlight` and `snippet` wrap matched terms in <mark> tags and are
+    not HTML-escaped.
+    """
+    rank = serializers.FloatField(read_only=True)
+    title_highlight = serializers.CharField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ('id', 'slug', 'title', 'final_price_value', 'main_image',
+                  'rank', 'title_highlight', 'snippet')
+
+
+
 class ProductImageSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField(read_only=True)
+
     class Meta:
         model = ProductImage
-        exclude = ('index',)
+        exclude = ('index', 'variants')
+
+    def get_srcset(self, obj:ProductImage):
+        """Map each format to {width: url} of the generated variants."""
+        request = self.context.get('request')
+        storage = obj.image.storage
+        srcset = {}
+        for image_format, widths in obj.variants.items():
+            srcset[image_format] = {}
+            for width, name in widths.items():
+                url = storage.url(name)
+                srcset[image_format][width] = request.build_absolute_uri(url) if request else url
+        return srcset
       
 
 
@@ -52,6 +101,80 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     
 
 
+class ProductRepriceSerializer(serializers.Serializer):
+    """
+    Validates a bulk repricing request.
+
+    Products are selected by `ids` and/or a `category` slug (optionally with
+    its descendants); at least one of `price_discount` (new discount
+    percentage) or `price_change_percent` (relative price change, e.g. -10)
+    must be given.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    category = serializers.SlugField(required=False)
+    include_descendants = serializers.BooleanField(default=False)
+    price_discount = serializers.DecimalField(
+        max_digits=4, decimal_places=2, min_value=Decimal('0'), max_value=Decimal('100'), required=False
+    )
+    price_change_percent = serializers.DecimalField(
+        max_digits=5, decimal_places=2, min_value=Decimal('-100'), required=False
+    )
+
+    def validate(self, attrs):
+        if 'ids' not in attrs and 'category' not in attrs:
+            raise serializers.ValidationError("Select products with `ids` and/or `category`.")
+        if 'price_discount' not in attrs and 'price_change_percent' not in attrs:
+            raise serializers.ValidationError("Give `price_discount` and/or `price_change_percent`.")
+        return attrs
+
+    def get_products(self):
+        """Return the queryset of products selected by the validated data."""
+        queryset = Product.objects.all()
+        if 'ids' in self.validated_data:
+            queryset = queryset.filter(pk__in=self.validated_data['ids'])
+        if 'category' in self.validated_data:
+            queryset = filter_by_category(
+                queryset, self.validated_data['category'], self.validated_data['include_descendants']
+            )
+        return queryset
+
+
+
+class ReservationItemSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField(source='product_id', min_value=1)
+
+    class Meta:
+        model = ReservationItem
+        fields = ('product', 'quantity')
+
+
+class ReservationSerializer(serializers.ModelSerializer):
+    """A stock reservation; on create only `items` is read, the rest is set by the service."""
+    items = ReservationItemSerializer(many=True)
+
+    class Meta:
+        model = Reservation
+        fields = ('id', 'status', 'expires_at', 'created_at', 'items')
+        read_only_fields = ('status', 'expires_at', 'created_at')
+
+    def validate_items(self, value):
+        if not value:
+            raise serializers.ValidationError("Reserve at least one item.")
+        return value
+
+
+class ProductVariantSerializer(serializers.ModelSerializer):
+    """A product variant; its option values are read from the combination key, not the M2M table."""
+    option_values = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductVariant
+        fields = ('id', 'sku', 'option_values', 'stock', 'price_delta')
+
+    def get_option_values(self, obj):
+        return [int(pk) for pk in obj.combination_key.split('-')]
+
+
 class OptionGroupSerializer(serializers.ModelSerializer):
     class Meta:
         model = OptionGroup
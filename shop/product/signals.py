@@ -0,0 +1,97 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from jobs.queue import enqueue
+
+from .facets import facet_index
+from .models import (FACET_INDEX_CACHE_KEY, CacheVersion, OptionValue, Product,
+                     ProductAttributeValue, ProductImage, ProductOptionGroup)
+
+
+def touch_products(product_ids):
+    """Bump `updated_at` so cached product payloads and validators are refreshed."""
+    Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+
+
+def queue_variant_sync(product_id):
+    """Regenerate the product's variants in the background; bursts of option edits queue one job."""
+    enqueue('product.sync_variants', {'product_id': product_id}, key=f'variants:{product_id}')
+
+
+@receiver(post_save, sender=ProductAttributeValue)
+def product_attribute_value_saved(sender, instance, created, **kwargs):
+    version = CacheVersion.bump(FACET_INDEX_CACHE_KEY)
+    queue_variant_sync(instance.product_id)
+    if created:
+        transaction.on_commit(partial(
+            facet_index.apply, instance.option_value_id, instance.product_id, True, version
+        ))
+
+
+@receiver(post_delete, sender=ProductAttributeValue)
+def product_attribute_value_deleted(sender, instance, **kwargs):
+    version = CacheVersion.bump(FACET_INDEX_CACHE_KEY)
+    queue_variant_sync(instance.product_id)
+
+    def apply():
+        # The same pair may be linked more than once; only clear the bit for the last link.
+        present = ProductAttributeValue.objects.filter(
+            product_id=instance.product_id, option_value_id=instance.option_value_id
+        ).exists()
+        facet_index.apply(instance.option_value_id, instance.product_id, present, version)
+
+    transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=OptionValue)
+@receiver(post_delete, sender=OptionValue)
+def option_value_changed(sender, instance, **kwargs):
+    CacheVersion.bump(FACET_INDEX_CACHE_KEY)
+    # Products without values of their own in the group vary along all of its values.
+    enqueue('product.sync_variants', {'option_group_id': instance.option_group_id},
+            key=f'variants:group:{instance.option_group_id}')
+
+
+@receiver(post_save, sender=ProductOptionGroup)
+@receiver(post_delete, sender=ProductOptionGroup)
+def product_option_group_changed(sender, instance, **kwargs):
+    queue_variant_sync(instance.product_id)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_image_changed(sender, instance, **kwargs):
+    touch_products([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.category.through)
+def product_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch_products([instance.pk])
+    elif action == 'pre_clear':
+        touch_products(list(instance.products.values_list('pk', flat=True)))
+    else:
+        touch_products(pk_set)
+
+
+@receiver(post_save, sender=ProductImage)
+def product_image_uploaded(sender, instance, created, **kwargs):
+    if not created or not instance.image:
+        return
+    if instance.content_hash:
+        # Identical content was uploaded before: reuse its variants, skip the work.
+        variants = (ProductImage.objects.filter(content_hash=instance.content_hash)
+                    .exclude(pk=instance.pk).exclude(variants={})
+                    .values_list('variants', flat=True).first())
+        if variants:
+            ProductImage.objects.filter(pk=instance.pk).update(variants=variants)
+            instance.variants = variants
+            return
+    key = f'image-variants:{instance.content_hash or instance.pk}'
+    enqueue('product.generate_image_variants', {'image_id': instance.pk}, key=key)
@@ -0,0 +1,51 @@
+from jobs.queue import task
+
+from .images import safe_generate_variants
+from .models import Product, ProductImage, ProductOptionGroup, Reservation
+from .reservations import release
+from .signals import touch_products
+from .variants import sync_variants
+
+
+@task('product.generate_image_variants')
+def generate_image_variants(image_id):
+    """
+    Build the resized copies of an uploaded image outside the request.
+
+    The copies are shared by every image with the same content hash.
+    """
+    image = ProductImage.objects.filter(pk=image_id).only('pk', 'image', 'content_hash').first()
+    if image is None or not image.image:
+        return
+    variants = safe_generate_variants(image.image.name)
+    if not variants:
+        return
+    if image.content_hash:
+        images = ProductImage.objects.filter(content_hash=image.content_hash)
+    else:
+        images = ProductImage.objects.filter(pk=image_id)
+    images.update(variants=variants)
+    # Cached product payloads include the srcset.
+    touch_products(images.values_list('product_id', flat=True))
+
+
+@task('product.release_reservation')
+def release_reservation(reservation_id):
+    """Put the stock of a reservation back once it expires, unless it was released already."""
+    release(reservation_id, status=Reservation.EXPIRED, expired_only=True)
+
+
+@task('product.sync_variants', batch=True)
+def sync_variants_task(payloads):
+    """
+    Regenerate the variants of the products whose options changed.
+
+    Payloads name a `product_id`, or an `option_group_id` when a value of
+    that group changed, which affects every product linked to the group.
+    """
+    product_ids = {payload['product_id'] for payload in payloads if 'product_id' in payload}
+    group_ids = {payload['option_group_id'] for payload in payloads if 'option_group_id' in payload}
+    if group_ids:
+        product_ids.update(ProductOptionGroup.objects.filter(option_group_id__in=group_ids)
+                           .values_list('product_id', flat=True))
+    sync_variants(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
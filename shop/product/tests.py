@@ -1,3 +1,1350 @@
-from django.test import TestCase
+import base64
+import json
+import multiprocessing
+import os
+import pstats
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.base import BaseHandler
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from PIL import Image
+
+from config.dbrouter import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, refresh_replicas
+from config.metrics import record_request
+from config.parsers import FastJSONParser
+from config.profiling import list_profiles
+from config.renderers import FastJSONRenderer
+from config.schema import api_fingerprint, build_schema, schema_cache
+from jobs.queue import claim, run_jobs
+
+from .cache import category_tree_cache
+from .facets import bitmap_to_ids, facet_index, ids_to_bitmap
+from .fast_serializers import product_card_serializer, serialize_product_cards, serialize_product_detail
+from .management.commands import gc_image_blobs
+from .serializer import ProductDetailSerializer, ProductListSerializer, ProductVariantSerializer
+from .views import ProductDetailView, ProductExportView
+from .models import (CATEGORY_TREE_CACHE_KEY, CacheVersion, Category, OptionGroup, OptionValue, Product,
+                     ProductAttributeValue, ProductImage, ProductOptionGroup, ProductVariant, Reservation, ReservationItem)
+from .reservations import OutOfStock, reserve
+from .variants import sync_variants
+
+
+class ProductListQueryCountTest(TestCase):
+    """ProductListView must build a page with a fixed number of queries."""
+
+    # COUNT(*) for pagination, the product page, and the main image prefetch.
+    EXPECTED_QUERIES = 3
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _seed(self, count):
+        products = Product.objects.bulk_create(
+            Product(title=f'Product {i}', slug=f'product-{i}', price=10)
+            for i in range(count)
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(product=product, image=f'products/{product.id}/images/{i}.jpg', index=i)
+            for product in products
+            for i in range(2)
+        )
+
+    def _assert_constant_queries(self, count):
+        self._seed(count)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(reverse('product_list'), {'limit': count})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), count)
+        for item in response.data['results']:
+            self.assertTrue(item['main_image']['image'].endswith('/0.jpg'))
+
+    def test_10_products(self):
+        self._assert_constant_queries(10)
+
+    def test_100_products(self):
+        self._assert_constant_queries(100)
+
+    def test_1000_products(self):
+        self._assert_constant_queries(1000)
+
+    def test_product_without_images(self):
+        Product.objects.create(title='No image', price=5)
+        response = self.client.get(reverse('product_list'))
+        self.assertIsNone(response.data['results'][0]['main_image'])
+
+
+class ProductCursorPaginationTest(TestCase):
+    """Keyset pagination walks the catalog without OFFSET or COUNT(*)."""
+
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(25):
+            Product.objects.create(title=f'Product {i}', price=10)
+
+    def _walk(self, limit):
+        seen = []
+        response = self.client.get(reverse('product_list'), {'pagination': 'cursor', 'limit': limit})
+        while True:
+            self.assertNotIn('count', response.data)
+            seen.extend(item['title'] for item in response.data['results'])
+            if not response.data['next']:
+                return seen
+            response = self.client.get(response.data['next'])
+
+    def test_walks_every_product_once_in_catalog_order(self):
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('title', flat=True))
+        self.assertEqual(self._walk(limit=7), expected)
+
+    def test_page_cost_is_constant(self):
+        first = self.client.get(reverse('product_list'), {'pagination': 'cursor', 'limit': 5})
+        # The page query plus the main image prefetch; no COUNT(*).
+        with self.assertNumQueries(2):
+            response = self.client.get(first.data['next'])
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_ties_on_created_at_are_paged_by_id(self):
+        Product.objects.update(created_at=timezone.now())
+        expected = list(Product.objects.order_by('-id').values_list('title', flat=True))
+        self.assertEqual(self._walk(limit=7), expected)
+        first = self.client.get(reverse('product_list'), {'pagination': 'cursor', 'limit': 5})
+        cursor = parse_qs(urlparse(first.data['next']).query)['cursor'][0]
+        # The whole position is in the cursor, with no offset into the tie group.
+        self.assertNotIn('o=', base64.b64decode(cursor).decode())
+        with self.assertNumQueries(2):
+            second = self.client.get(first.data['next'])
+        self.assertEqual([item['title'] for item in second.data['results']], expected[5:10])
+        previous = self.client.get(second.data['previous'])
+        self.assertEqual([item['title'] for item in previous.data['results']], expected[:5])
+
+    def test_invalid_cursor(self):
+        cursor = base64.b64encode(b'p=yesterday').decode()
+        response = self.client.get(reverse('product_list'), {'pagination': 'cursor', 'cursor': cursor})
+        self.assertEqual(response.status_code, 404)
+
+    def test_offset_mode_still_available(self):
+        response = self.client.get(reverse('product_list'), {'limit': 5, 'offset': 20})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 5)
+
+
+class CategoryPathTest(TestCase):
+    """The materialized path follows every move and delete in the tree."""
+
+    def setUp(self):
+        self.electronics = Category.objects.create(title='Electronics')
+        self.phones = Category.objects.create(title='Phones', parent=self.electronics)
+        self.android = Category.objects.create(title='Android', parent=self.phones)
+        self.books = Category.objects.create(title='Books')
+
+    def _path(self, category):
+        category.refresh_from_db()
+        return category.path
+
+    def test_paths_and_lookups(self):
+        self.assertEqual(self._path(self.android), f'/{self.electronics.pk}/{self.phones.pk}/{self.android.pk}/')
+        self.assertQuerySetEqual(
+            self.electronics.get_descendants(), [self.android, self.phones], ordered=False
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(self.android.get_ancestors(), [self.electronics, self.phones])
+
+    def test_move_rewrites_subtree(self):
+        self.phones.parent = self.books
+        self.phones.save()
+        self.assertEqual(self._path(self.android), f'/{self.books.pk}/{self.phones.pk}/{self.android.pk}/')
+        self.assertFalse(self.electronics.get_descendants().exists())
+
+    def test_delete_reroots_children(self):
+        self.phones.delete()
+        self.assertEqual(self._path(self.android), f'/{self.android.pk}/')
+
+    def test_cannot_move_under_descendant(self):
+        self.electronics.parent = self.android
+        with self.assertRaises(ValueError):
+            self.electronics.save()
+        self.assertEqual(self._path(self.electronics), f'/{self.electronics.pk}/')
+
+    def test_bulk_writes_keep_paths_and_bump_the_tree_version(self):
+        def bumps(write):
+            version = CacheVersion.current(CATEGORY_TREE_CACHE_KEY)
+            write()
+            return CacheVersion.current(CATEGORY_TREE_CACHE_KEY) - version
+
+        self.assertEqual(bumps(lambda: Category.objects.filter(pk=self.phones.pk).update(parent=self.books)), 1)
+        self.assertEqual(self._path(self.android), f'/{self.books.pk}/{self.phones.pk}/{self.android.pk}/')
+        self.assertEqual(bumps(lambda: Category.objects.filter(pk=self.books.pk).update(is_active=False)), 1)
+
+        comics = Category(title='Comics', parent=self.books)
+        self.assertEqual(bumps(lambda: Category.objects.bulk_create([comics])), 1)
+        self.assertEqual((comics.slug, self._path(comics)), ('comics', f'/{self.books.pk}/{comics.pk}/'))
+
+        self.phones.parent = None
+        self.assertEqual(bumps(lambda: Category.objects.bulk_update([self.phones], ['parent'])), 1)
+        self.assertEqual(self._path(self.android), f'/{self.phones.pk}/{self.android.pk}/')
+
+        self.assertEqual(bumps(lambda: Category.objects.filter(pk=self.phones.pk).delete()), 1)
+        self.assertEqual(self._path(self.android), f'/{self.android.pk}/')
+
+        with self.assertRaises(ValueError):
+            Category.objects.filter(pk=self.books.pk).update(parent=comics)
+        self.assertIsNone(Category.objects.get(pk=self.books.pk).parent_id)
+
+
+class ProductCategoryFilterTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        electronics = Category.objects.create(title='Electronics')
+        phones = Category.objects.create(title='Phones', parent=electronics)
+        books = Category.objects.create(title='Books')
+        Product.objects.create(title='Radio').category.add(electronics)
+        Product.objects.create(title='Phone').category.add(phones, electronics)
+        Product.objects.create(title='Novel').category.add(books)
+
+    def _titles(self, **params):
+        response = self.client.get(reverse('product_list'), params)
+        return sorted(item['title'] for item in response.data['results'])
+
+    def test_direct_category(self):
+        self.assertEqual(self._titles(category='phones'), ['Phone'])
+
+    def test_include_descendants(self):
+        self.assertEqual(self._titles(category='electronics', include_descendants=1), ['Phone', 'Radio'])
+
+    def test_unknown_category(self):
+        self.assertEqual(self._titles(category='missing', include_descendants=1), [])
+
+
+class CategoryTreeEndpointTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        category_tree_cache.clear()
+        self.electronics = Category.objects.create(title='Electronics')
+        Category.objects.create(title='Phones', parent=self.electronics)
+
+    def _tree(self):
+        return self.client.get(reverse('category-tree')).json()
+
+    def test_nested_tree(self):
+        tree = self._tree()
+        self.assertEqual([node['title'] for node in tree], ['Electronics'])
+        self.assertEqual([node['title'] for node in tree[0]['children']], ['Phones'])
+
+    def test_served_from_cache_until_a_write(self):
+        self._tree()
+        # Only the version check hits the database.
+        with self.assertNumQueries(1):
+            self._tree()
+        Category.objects.create(title='Tablets', parent=self.electronics)
+        children = self._tree()[0]['children']
+        self.assertEqual([node['title'] for node in children], ['Phones', 'Tablets'])
+
+    def test_delete_invalidates(self):
+        self._tree()
+        self.electronics.delete()
+        self.assertEqual([node['title'] for node in self._tree()], ['Phones'])
+
+
+class FacetIndexTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        facet_index.clear()
+        color = OptionGroup.objects.create(title='Color')
+        size = OptionGroup.objects.create(title='Size')
+        self.red = OptionValue.objects.create(value='Red', option_group=color)
+        self.blue = OptionValue.objects.create(value='Blue', option_group=color)
+        self.large = OptionValue.objects.create(value='L', option_group=size)
+        self.shirt = Product.objects.create(title='Shirt')
+        self.hat = Product.objects.create(title='Hat')
+        self.scarf = Product.objects.create(title='Scarf')
+        for product, value in ((self.shirt, self.red), (self.shirt, self.large),
+                               (self.hat, self.red), (self.scarf, self.blue), (self.scarf, self.large)):
+            ProductAttributeValue.objects.create(product=product, option_value=value)
+
+    def _get(self, *values, **params):
+        params['options'] = ','.join(str(value.pk) for value in values)
+        return self.client.get(reverse('product_list'), params).data
+
+    def _titles(self, *values):
+        return sorted(item['title'] for item in self._get(*values)['results'])
+
+    def test_and_across_groups_or_within_group(self):
+        self.assertEqual(self._titles(self.red, self.large), ['Shirt'])
+        self.assertEqual(self._titles(self.red, self.blue), ['Hat', 'Scarf', 'Shirt'])
+        self.assertEqual(self._titles(self.red, self.blue, self.large), ['Scarf', 'Shirt'])
+
+    def test_facet_counts(self):
+        facets = self._get(self.large, facets=1)['facets']
+        # Color counts are restricted to size L; size counts ignore the size selection.
+        self.assertEqual(facets, {self.red.pk: 1, self.blue.pk: 1, self.large.pk: 2})
+
+    def test_incremental_updates(self):
+        self.assertEqual(self._titles(self.blue), ['Scarf'])
+        with self.captureOnCommitCallbacks(execute=True):
+            link = ProductAttributeValue.objects.create(product=self.hat, option_value=self.blue)
+        version = facet_index._version
+        self.assertEqual(self._titles(self.blue), ['Hat', 'Scarf'])
+        with self.captureOnCommitCallbacks(execute=True):
+            link.delete()
+        self.assertEqual(facet_index._version, version + 1)
+        self.assertEqual(self._titles(self.blue), ['Scarf'])
+
+    def test_cascade_delete_is_reflected(self):
+        self.assertEqual(self._titles(self.red), ['Hat', 'Shirt'])
+        self.shirt.delete()
+        self.assertEqual(self._titles(self.red), ['Hat'])
+
+    def test_counts_follow_the_listed_products(self):
+        hats = Category.objects.create(title='Hats')
+        self.hat.category.add(hats)
+        Product.objects.filter(pk=self.scarf.pk).update(is_active=False)
+        self.assertEqual(self._titles(self.blue), [])
+        facets = self._get(facets=1)['facets']
+        self.assertEqual(facets, {self.red.pk: 2, self.blue.pk: 0, self.large.pk: 1})
+        facets = self._get(self.red, facets=1, category='hats')['facets']
+        self.assertEqual(facets, {self.red.pk: 1, self.blue.pk: 0, self.large.pk: 0})
+        self.assertEqual(self._get(self.red, category='hats')['count'], 1)
+
+    def test_filter_without_json_each(self):
+        with patch.object(connection, 'vendor', 'postgresql'):
+            queryset = facet_index.filter(Product.objects.all(), [self.red.pk])
+            self.assertNotIn('json_each', str(queryset.query))
+        self.assertEqual(sorted(queryset.values_list('title', flat=True)), ['Hat', 'Shirt'])
+
+    def test_bitmap_round_trip(self):
+        ids = [0, 7, 8, 63, 64, 1000, 4097]
+        self.assertEqual(ids_to_bitmap(ids), sum(1 << product_id for product_id in ids))
+        self.assertEqual(bitmap_to_ids(ids_to_bitmap(ids)), ids)
+        self.assertEqual(ids_to_bitmap([]), 0)
+
+    def test_filter_binds_one_parameter(self):
+        queryset = facet_index.filter(Product.objects.all(), [self.red.pk])
+        self.assertEqual(sorted(queryset.values_list('title', flat=True)), ['Hat', 'Shirt'])
+        _, params = queryset.query.sql_with_params()
+        self.assertEqual(len(params), 1)
+
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.phone = Product.objects.create(title='Android Phone', description='A smartphone with a large screen')
+        self.case = Product.objects.create(title='Leather case', description='Fits any phone')
+        Product.objects.create(title='Novel', description='A paperback book')
+
+    def _search(self, **params):
+        return self.client.get(reverse('product_search'), params)
+
+    def test_ranked_with_highlights(self):
+        results = self._search(q='phone').data['results']
+        self.assertEqual([item['id'] for item in results], [self.phone.pk, self.case.pk])
+        self.assertEqual(results[0]['title_highlight'], 'Android <mark>Phone</mark>')
+        self.assertIn('<mark>phone</mark>', results[1]['snippet'])
+
+    def test_prefix_matching(self):
+        results = self._search(q='smart').data['results']
+        self.assertEqual([item['id'] for item in results], [self.phone.pk])
+
+    def test_index_follows_writes(self):
+        self.case.title = 'Leather wallet'
+        self.case.description = 'Holds cards'
+        self.case.save()
+        self.phone.delete()
+        self.assertEqual(self._search(q='phone').data['results'], [])
+        self.assertEqual(len(self._search(q='wallet').data['results']), 1)
+
+    def test_pagination(self):
+        first = self._search(q='phone', limit=1).data
+        self.assertEqual(len(first['results']), 1)
+        second = self.client.get(first['next']).data
+        self.assertEqual(second['results'][0]['id'], self.case.pk)
+        self.assertIsNone(second['next'])
+
+    def test_query_required(self):
+        self.assertEqual(self._search(q=' ').status_code, 400)
+
+    def test_operators_are_treated_as_text(self):
+        self.assertEqual(self._search(q='phone" OR -"').status_code, 200)
+
+    def test_highlights_are_escaped(self):
+        Product.objects.create(title='<script>alert(1)</script> Tablet', description='<img src=x onerror=alert(1)> tablet')
+        result = self._search(q='tablet').data['results'][0]
+        self.assertEqual(result['title_highlight'], '&lt;script&gt;alert(1)&lt;/script&gt; <mark>Tablet</mark>')
+        self.assertNotIn('<img', result['snippet'])
+        self.assertIn('<mark>tablet</mark>', result['snippet'])
+
+
+class ProductDetailCachingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        self.category = Category.objects.create(title='Phones')
+        self.product = Product.objects.create(title='Phone', price=100)
+        self.product.category.add(self.category)
+        self.url = reverse('product_detail', args=[self.product.pk])
+
+    def _etag(self):
+        return self.client.get(self.url)['ETag']
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['category'], ['Phones'])
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_rendered_payload_is_cached(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['title'], 'Phone')
+
+    def test_invalidated_by_related_writes(self):
+        etags = {self._etag()}
+        image = ProductImage.objects.create(product=self.product, image='products/1/images/a.jpg')
+        etags.add(self._etag())
+        self.assertEqual(len(self.client.get(self.url).json()['image']), 1)
+        image.delete()
+        etags.add(self._etag())
+        self.product.category.remove(self.category)
+        etags.add(self._etag())
+        self.assertEqual(self.client.get(self.url).json()['category'], [])
+        self.product.category.add(self.category)
+        self.category.title = 'Mobiles'
+        self.category.save()
+        etags.add(self._etag())
+        self.assertEqual(self.client.get(self.url).json()['category'], ['Mobiles'])
+        self.assertEqual(len(etags), 5)
+
+    def test_missing_product(self):
+        response = self.client.get(reverse('product_detail', args=[self.product.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_content_negotiation(self):
+        json_etag = self._etag()
+        response = self.client.get(self.url, HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+        self.assertIn('Accept', response['Vary'])
+        html_etag = response['ETag']
+        response = self.client.get(self.url, HTTP_ACCEPT='application/json; indent=2')
+        self.assertIn(b'\n  "title": "Phone"', response.content)
+        # Each representation has its own strong validator.
+        self.assertEqual(len({json_etag, html_etag, response['ETag']}), 3)
+        response = self.client.get(self.url, HTTP_ACCEPT='application/json; indent=2', HTTP_IF_NONE_MATCH=json_etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=json_etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept', response['Vary'])
+        self.assertEqual(self.client.get(self.url, HTTP_ACCEPT='application/xml').status_code, 406)
+
+
+class ImportProductsCommandTest(TestCase):
+    def setUp(self):
+        self.phones = Category.objects.create(title='Phones')
+        Product.objects.create(title='Old Phone', slug='old-phone', price=50)
+
+    def _write(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w') as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def _import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_products', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_upsert(self):
+        path = self._write('.csv', (
+            'title,slug,price,price_discount,stock,categories\n'
+            'Android Phone,,200,10,5,phones|missing\n'
+            'Old Phone,old-phone,80,25,1,phones\n'
+            ',,10,0,1,\n'
+        ))
+        out, err = self._import(path, '--batch-size', '2')
+        self.assertIn('1 created, 1 updated, 1 skipped', out)
+        self.assertIn('rows/sec', out)
+        self.assertIn('Row 3: title is required', err)
+        self.assertIn('missing', err)
+
+        android = Product.objects.get(slug='android-phone')
+        self.assertEqual(android.final_price_value, Decimal('180.00'))
+        self.assertEqual(list(android.category.all()), [self.phones])
+        old = Product.objects.get(slug='old-phone')
+        self.assertEqual((old.price, old.final_price_value), (Decimal('80.00'), Decimal('60.00')))
+        self.assertEqual(list(old.category.all()), [self.phones])
+
+    def test_jsonl(self):
+        rows = [{'title': f'Item {i}', 'price': '9.99', 'categories': ['phones']} for i in range(5)]
+        path = self._write('.jsonl', '\n'.join(json.dumps(row) for row in rows))
+        out, _ = self._import(path, '--batch-size', '2')
+        self.assertIn('5 created', out)
+        self.assertEqual(self.phones.products.count(), 5)
+
+    def test_jsonl_bad_lines_are_reported(self):
+        path = self._write('.jsonl', '{"title": "Lamp"}\n\n{"title": \n[1, 2]\n{"title": "Desk"}\n')
+        out, err = self._import(path)
+        self.assertIn('2 created', out)
+        self.assertIn('2 skipped', out)
+        self.assertIn('Row 2: line 3: invalid JSON', err)
+        self.assertIn('Row 3: line 4: expected a JSON object, got list', err)
+
+
+class RepriceProductsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_user(
+            username='staff', password='secret', phone_number='+989120000000', is_staff=True
+        )
+        self.electronics = Category.objects.create(title='Electronics')
+        phones = Category.objects.create(title='Phones', parent=self.electronics)
+        self.phone = Product.objects.create(title='Phone', price=Decimal('0.30'))
+        self.phone.category.add(phones)
+        self.radio = Product.objects.create(title='Radio', price=Decimal('19.99'), price_discount=5)
+        self.radio.category.add(self.electronics)
+        self.book = Product.objects.create(title='Book', price=Decimal('10.00'))
+
+    def _post(self, data):
+        return self.client.post(reverse('product_reprice'), data, format='json')
+
+    def test_requires_staff(self):
+        self.assertEqual(self._post({'ids': [self.book.pk], 'price_discount': '10'}).status_code, 403)
+
+    def test_discount_category_subtree(self):
+        self.client.force_authenticate(self.staff)
+        response = self._post({'category': 'electronics', 'include_descendants': True, 'price_discount': '25'})
+        self.assertEqual(response.data, {'updated': 2})
+        for product in (self.phone, self.radio):
+            product.refresh_from_db()
+            self.assertEqual(product.price_discount, Decimal('25.00'))
+            # 0.30 * 0.75 = 0.225 rounds half to even, as save() does.
+            self.assertEqual(product.final_price_value, Product.compute_final_price(
+                product.price, product.price_discount).quantize(Decimal('0.01')))
+        self.assertEqual(self.phone.final_price_value, Decimal('0.22'))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.price_discount, Decimal('0.00'))
+
+    def test_validation(self):
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(self._post({'price_discount': '10'}).status_code, 400)
+        self.assertEqual(self._post({'ids': [self.book.pk]}).status_code, 400)
+        self.assertEqual(self._post({'ids': [self.book.pk], 'price_discount': '120'}).status_code, 400)
+
+    def test_command_price_change(self):
+        call_command('reprice_products', '--ids', f'{self.radio.pk},{self.book.pk}',
+                     '--price-change', '-10', '--batch-size', '1', stdout=StringIO())
+        self.radio.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.price, Decimal('9.00'))
+        self.assertEqual(self.radio.price, Decimal('17.99'))
+        self.assertEqual(self.radio.final_price_value, Decimal('17.09'))
+
+
+class ProductExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username='partner', password='secret', phone_number='+989120000001'
+        )
+        category = Category.objects.create(title='Phones')
+        for i in range(7):
+            product = Product.objects.create(title=f'Phone {i}', price=10, is_active=i != 3)
+            product.category.add(category)
+            ProductImage.objects.create(product=product, image=f'products/{product.id}/images/a.jpg')
+
+    def test_requires_authentication(self):
+        self.assertIn(self.client.get(reverse('product_export')).status_code, (401, 403))
+
+    def test_streams_active_products_with_batched_prefetch(self):
+        self.client.force_authenticate(self.user)
+        with self.settings(DEBUG=False):
+            response = self.client.get(reverse('product_export'))
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            # One cursor over the products, fetched in chunks of 3, plus
+            # an image and a category prefetch per chunk.
+            with patch.object(ProductExportView, 'chunk_size', 3):
+                response = self.client.get(reverse('product_export'))
+                with self.assertNumQueries(5):
+                    lines = b''.join(response.streaming_content).splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['title'] for row in rows], [f'Phone {i}' for i in range(7) if i != 3])
+        self.assertEqual(rows[0]['category'], ['Phones'])
+        self.assertEqual(len(rows[0]['image']), 1)
+
+
+class ImageVariantTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root.name))
+        self.product = Product.objects.create(title='Phone')
+
+    def _png(self, width, height):
+        buffer = BytesIO()
+        Image.new('RGBA', (width, height), (255, 0, 0, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+    def test_upload_generates_srcset(self):
+        response = self.client.post(
+            reverse('product_image'), {'product': self.product.pk, 'image': self._png(700, 350)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 201)
+        # Variants are built by the job queue, not in the request.
+        self.assertEqual(response.data['srcset'], {})
+        self.assertEqual(run_jobs(claim(10)), 0)
+        response = self.client.get(reverse('product_image', args=[response.data['id']]))
+        srcset = response.data['srcset']
+        self.assertEqual(set(srcset), {'webp', 'jpeg'})
+        self.assertEqual(set(srcset['webp']), {'160', '320', '640'})
+        self.assertTrue(srcset['jpeg']['320'].startswith('http://testserver/media/products/'))
+        image = ProductImage.objects.get()
+        with image.image.storage.open(image.variants['webp']['320']) as stream:
+            self.assertEqual(Image.open(stream).size, (320, 160))
+
+    def test_regenerate_command(self):
+        image = ProductImage.objects.create(product=self.product, image=self._png(200, 100))
+        ProductImage.objects.filter(pk=image.pk).update(variants={})
+        ProductImage.objects.create(product=self.product, image='products/missing.jpg')
+        out = StringIO()
+        call_command('regenerate_image_variants', '--workers', '2', '--missing-only', stdout=out)
+        self.assertIn('Processed 2 images', out.getvalue())
+        self.assertIn('(1 failed)', out.getvalue())
+        image.refresh_from_db()
+        self.assertEqual(set(image.variants['jpeg']), {'160'})
+
+
+class ImageDeduplicationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        self.enterContext(self.settings(MEDIA_ROOT=media_root.name))
+        self.phone = Product.objects.create(title='Phone')
+        self.case = Product.objects.create(title='Case')
+
+    def _upload(self, product, color='red', name='photo.png'):
+        buffer = BytesIO()
+        Image.new('RGB', (200, 100), color).save(buffer, 'PNG')
+        upload = SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+        response = self.client.post(
+            reverse('product_image'), {'product': product.pk, 'image': upload}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 201)
+        return ProductImage.objects.get(pk=response.data['id'])
+
+    def _stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_identical_uploads_share_one_blob_and_its_variants(self):
+        first = self._upload(self.phone, name='a.png')
+        run_jobs(claim(10))
+        second = self._upload(self.case, name='b.PNG')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith(f'products/blobs/{first.content_hash[:2]}/'))
+        # The second upload reuses the variants without queueing any work.
+        self.assertEqual(claim(10), [])
+        second.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual(second.variants, first.variants)
+        # One original plus one 160px WebP and JPEG.
+        self.assertEqual(len(self._stored_files()), 3)
+
+        self._upload(self.case, color='blue')
+        self.assertEqual(len(self._stored_files()), 4)
+
+    def test_gc_removes_unreferenced_blobs(self):
+        kept = self._upload(self.phone)
+        orphan = self._upload(self.case, color='blue')
+        run_jobs(claim(10))
+        orphan.delete()
+        out = StringIO()
+        call_command('gc_image_blobs', '--grace-minutes', '0', stdout=out)
+        self.assertIn('Deleted 3 files', out.getvalue())
+        kept.refresh_from_db()
+        expected = sorted([kept.image.name] + [name for widths in kept.variants.values() for name in widths.values()])
+        self.assertEqual(self._stored_files(), expected)
+
+    def test_reusing_a_blob_touches_it(self):
+        first = self._upload(self.phone)
+        path = first.image.path
+        os.utime(path, (0, 0))
+        second = self._upload(self.case)
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertGreater(os.path.getmtime(path), 0)
+        out = StringIO()
+        first.delete()
+        second.delete()
+        call_command('gc_image_blobs', stdout=out)
+        self.assertIn('Deleted 0 files', out.getvalue())
+
+    def test_gc_keeps_blobs_referenced_during_the_walk(self):
+        orphan = self._upload(self.phone)
+        name = orphan.image.name
+        orphan.delete()
+        walk = gc_image_blobs.walk
+
+        def walk_and_upload(storage, directory):
+            # A reusing upload lands after the command read the references.
+            ProductImage.objects.create(product=self.case, image=name, content_hash='0' * 64)
+            yield from walk(storage, directory)
+
+        out = StringIO()
+        with patch.object(gc_image_blobs, 'walk', walk_and_upload):
+            call_command('gc_image_blobs', '--grace-minutes', '0', stdout=out)
+        self.assertIn('Deleted 0 files', out.getvalue())
+        self.assertEqual(self._stored_files(), [name])
+
+
+class AsyncCatalogViewsTest(TestCase):
+    """The async endpoints return exactly what their sync counterparts do."""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(title='Phones')
+        for i in range(5):
+            product = Product.objects.create(title=f'Phone {i}', price=10)
+            product.category.add(category)
+            ProductImage.objects.create(product=product, image=f'products/{product.id}/images/a.jpg')
+        self.product = product
+
+    async def _assert_same(self, sync_url, async_url, params=None):
+        sync_response = await self.async_client.get(sync_url, params or {})
+        async_response = await self.async_client.get(async_url, params or {})
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        # Pagination links only differ in the /async prefix.
+        self.assertEqual(async_response.content.replace(b'/api/async/', b'/api/'), sync_response.content)
+
+    async def test_product_list(self):
+        await self._assert_same(reverse('product_list'), reverse('async_product_list'), {'limit': 2, 'offset': 1})
+
+    async def test_product_detail(self):
+        pk = self.product.pk
+        await self._assert_same(reverse('product_detail', args=[pk]), reverse('async_product_detail', args=[pk]))
+        response = await self.async_client.get(reverse('async_product_detail', args=[pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_category_list(self):
+        await self._assert_same(reverse('category-list'), reverse('async_category_list'))
+
+
+class FastSerializerTest(TestCase):
+    """The fast read path renders byte-identical JSON to the DRF serializers."""
+
+    def setUp(self):
+        phones = Category.objects.create(title='Phones')
+        sale = Category.objects.create(title='Sale')
+        self.with_images = Product.objects.create(
+            title='Phone', description='A phone', price=Decimal('19.99'), price_discount=Decimal('12.50')
+        )
+        self.with_images.category.add(sale, phones)
+        ProductImage.objects.create(
+            product=self.with_images, image='products/1/images/a.jpg', alt_text='Front',
+            variants={'webp': {'160': 'products/1/images/variants/a_160.webp'}},
+        )
+        ProductImage.objects.create(product=self.with_images, image='products/1/images/b.jpg', index=1)
+        self.without_images = Product.objects.create(title='Case', price=5, is_active=False)
+        self.request = APIRequestFactory().get('/api/product/')
+
+    def _render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_product_cards(self):
+        products = Product.objects.all()
+        expected = ProductListSerializer(products, many=True).data
+        rows = products.values(*product_card_serializer.columns)
+        with self.assertNumQueries(2):
+            actual = serialize_product_cards(rows)
+        self.assertEqual(self._render(actual), self._render(expected))
+
+    def test_product_detail(self):
+        for product in Product.objects.all():
+            expected = ProductDetailSerializer(product, context={'request': self.request}).data
+            actual = serialize_product_detail(product.pk, self.request)
+            self.assertEqual(self._render(actual), self._render(expected))
+        self.assertIsNone(serialize_product_detail(self.without_images.pk + 1))
+
+
+class FastJSONRendererTest(TestCase):
+    """FastJSONRenderer/FastJSONParser behave like DRF's JSON renderer and parser."""
+
+    def setUp(self):
+        category = Category.objects.create(title='Phones')
+        for i in range(3):
+            product = Product.objects.create(
+                title=f'Phone \u2028 {i} \u00e9', price=Decimal('19.99'), price_discount=Decimal('12.50')
+            )
+            product.category.add(category)
+            ProductImage.objects.create(product=product, image=f'products/{product.id}/images/a.jpg')
+
+    def test_matches_json_renderer(self):
+        payloads = [
+            ProductDetailSerializer(Product.objects.all(), many=True).data,
+            # Raw rows: Decimal, aware datetime and None values go through the encoder.
+            list(Product.objects.values()),
+            {'facets': {1: 2, 3: 4}, 'rank': -1.5, 'ok': True, 'next': None},
+        ]
+        for data in payloads:
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+        self.assertEqual(
+            FastJSONRenderer().render({'a': [1]}, 'application/json; indent=2'),
+            JSONRenderer().render({'a': [1]}, 'application/json; indent=2'),
+        )
+        big = {'id': 2 ** 70}
+        self.assertEqual(FastJSONRenderer().render(big), JSONRenderer().render(big))
+
+    def test_non_finite_floats(self):
+        for value in (float('nan'), float('inf'), -float('inf')):
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({'rank': [value]})
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render({'rank': [value]})
+        # With STRICT_JSON off both write the JavaScript literals; a Decimal reaches orjson through the encoder.
+        data = {'rank': float('nan'), 'price': Decimal('Infinity'), 'next': None}
+        fast, stock = FastJSONRenderer(), JSONRenderer()
+        fast.strict = stock.strict = False
+        self.assertEqual(fast.render(data), stock.render(data))
+        self.assertEqual(fast.render(data), b'{"rank":NaN,"price":Infinity,"next":null}')
+
+    def test_floats_with_an_exponent(self):
+        # bm25 ranks from the search endpoint are small enough to need one.
+        for value in (1e16, 0.00001, -1.2e-6, 1.234e20, 0.0001, 1e15, 5e-324):
+            data = {'rank': value, 'results': [{'rank': value}]}
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        data = {'rank': 1.5, 'url': 'http://testserver/?q=1e5'}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser(self):
+        data = {'title': 'Phone \u00e9', 'price': 19.99, 'ids': [1, 2]}
+        parsed = FastJSONParser().parse(BytesIO(JSONRenderer().render(data)))
+        self.assertEqual(parsed, data)
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b'{"price": NaN}'))
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b'{"title": '))
+
+
+class QueryInstrumentationMiddlewareTest(TestCase):
+    """Every response reports its SQL work in Server-Timing and the config.sql log."""
+
+    def setUp(self):
+        for i in range(3):
+            product = Product.objects.create(title=f'Phone {i}')
+            ProductImage.objects.create(product=product, image=f'products/{product.id}/images/a.jpg')
+
+    def test_server_timing_and_log(self):
+        with self.assertLogs('config.sql', 'INFO') as logs:
+            response = self.client.get(reverse('product_list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="3 queries", app;dur=[\d.]+$')
+        record = logs.records[0]
+        self.assertEqual(record.levelname, 'INFO')
+        self.assertEqual(record.sql['queries'], 3)
+        self.assertEqual(record.sql['path'], reverse('product_list'))
+        self.assertEqual(len(record.sql['slowest']), 3)
+        self.assertNotIn('all', record.sql)
+
+    @override_settings(SQL_LOG_MAX_QUERIES=2)
+    def test_threshold_logs_every_query(self):
+        with self.assertLogs('config.sql', 'WARNING') as logs:
+            self.client.get(reverse('product_list'))
+        record = logs.records[0]
+        self.assertIn('thresholds_exceeded=1', record.getMessage())
+        self.assertEqual(len(record.sql['all']), 3)
+        self.assertEqual(record.sql['most_repeated']['count'], 1)
+
+    async def test_async_request(self):
+        with self.assertLogs('config.sql', 'INFO') as logs:
+            response = await self.async_client.get(reverse('product_list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="3 queries", app;dur=[\d.]+$')
+        self.assertEqual(logs.records[0].sql['queries'], 3)
+
+
+class RequestProfilingTest(TestCase):
+    """Staff can profile single requests and fetch the stored profiles."""
+
+    def setUp(self):
+        profiles_root = tempfile.TemporaryDirectory()
+        self.addCleanup(profiles_root.cleanup)
+        self.enterContext(self.settings(PROFILES_ROOT=profiles_root.name))
+        User = get_user_model()
+        self.staff = User.objects.create_user(
+            username='staff', password='secret', phone_number='+989120000000', is_staff=True
+        )
+        self.customer = User.objects.create_user(username='customer', password='secret', phone_number='+989120000001')
+        Product.objects.create(title='Phone')
+
+    def test_cprofile(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('product_list'), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+
+        profiles = self.client.get(reverse('profile_list')).json()
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0]['id'], profile_id)
+        self.assertEqual(profiles[0]['view'], 'product_list')
+        self.assertEqual(profiles[0]['user'], 'staff')
+        self.assertGreater(profiles[0]['duration_ms'], 0)
+
+        download = self.client.get(profiles[0]['url'])
+        self.assertEqual(download.status_code, 200)
+        with tempfile.NamedTemporaryFile(suffix='.prof') as stream:
+            stream.write(b''.join(download.streaming_content))
+            stream.flush()
+            self.assertGreater(pstats.Stats(stream.name).total_calls, 0)
+        self.assertEqual(self.client.get(reverse('profile_detail', args=['..'])).status_code, 404)
+
+    def test_sampling_profile_is_speedscope_json(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('product_list'), {'profile': 'sample'})
+        download = self.client.get(reverse('profile_detail', args=[response['X-Profile-Id']]))
+        profile = json.loads(b''.join(download.streaming_content))
+        self.assertEqual(profile['profiles'][0]['type'], 'sampled')
+        self.assertIn('frames', profile['shared'])
+
+    def test_staff_only(self):
+        response = self.client.get(reverse('product_list'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse('product_list'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.client.get(reverse('profile_list')).status_code, 403)
+
+    def test_api_authenticated_staff_is_recorded(self):
+        credentials = base64.b64encode(b'staff:secret').decode()
+        response = self.client.get(reverse('product_list'), HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Basic {credentials}')
+        self.assertIn('X-Profile-Id', response)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('profile_list')).json()[0]['user'], 'staff')
+
+    async def test_async_request(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('product_list'), headers={'X-Profile': 'cprofile'})
+        self.assertEqual(response.status_code, 200)
+        profiles = await sync_to_async(list_profiles)()
+        self.assertEqual(profiles[0]['id'], response['X-Profile-Id'])
+        self.assertEqual(profiles[0]['user'], 'staff')
+
+    async def test_async_view_is_profiled(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('async_product_list'), headers={'X-Profile': 'cprofile'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        path = os.path.join(settings.PROFILES_ROOT, response['X-Profile-Id'] + '.prof')
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+        # The view's own coroutine and the ORM work it hands to sync_to_async.
+        self.assertIn('_paginate', functions)
+        self.assertIn('execute_sql', functions)
+
+
+class MetricsEndpointTest(TestCase):
+    """/metrics exposes per-route request, latency and DB metrics summed over all workers."""
+
+    def setUp(self):
+        metrics_root = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_root.cleanup)
+        self.enterContext(self.settings(METRICS_ROOT=metrics_root.name))
+        self.product = Product.objects.create(title='Phone')
+
+    def _metrics(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()
+
+    def test_request_metrics(self):
+        self.client.get(reverse('product_list'))
+        self.client.get(reverse('product_list'))
+        self.client.get(reverse('product_detail', args=[self.product.pk + 1]))
+        lines = self._metrics()
+        self.assertIn('http_requests_total{route="product_list",method="GET",status="2xx"} 2', lines)
+        self.assertIn('http_requests_total{route="product_detail",method="GET",status="4xx"} 1', lines)
+        self.assertIn('http_request_duration_seconds_bucket{route="product_list",method="GET",le="+Inf"} 2', lines)
+        self.assertIn('http_request_duration_seconds_count{route="product_list",method="GET"} 2', lines)
+        # Three queries per list page: the count, the page and its main images.
+        self.assertIn('db_queries_total{route="product_list"} 6', lines)
+        self.assertTrue(any(line.startswith('db_query_duration_seconds_total{route="product_list"} ') for line in lines))
+
+    async def test_async_request_metrics(self):
+        await self.async_client.get(reverse('product_list'))
+        lines = await sync_to_async(self._metrics)()
+        self.assertIn('http_requests_total{route="product_list",method="GET",status="2xx"} 1', lines)
+        self.assertIn('db_queries_total{route="product_list"} 3', lines)
+
+    def test_aggregates_worker_processes(self):
+        record_request('product_list', 'GET', 200, 0.02)
+        worker = multiprocessing.get_context('fork').Process(
+            target=record_request, args=('product_list', 'GET', 500, 3.0)
+        )
+        worker.start()
+        worker.join()
+        lines = self._metrics()
+        self.assertIn('http_requests_total{route="product_list",method="GET",status="2xx"} 1', lines)
+        self.assertIn('http_requests_total{route="product_list",method="GET",status="5xx"} 1', lines)
+        self.assertIn('http_request_duration_seconds_bucket{route="product_list",method="GET",le="0.025"} 1', lines)
+        self.assertIn('http_request_duration_seconds_bucket{route="product_list",method="GET",le="5.0"} 2', lines)
+        self.assertIn('http_request_duration_seconds_sum{route="product_list",method="GET"} 3.02', lines)
+
+    def test_token(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+
+
+class ReservationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='buyer', password='secret', phone_number='+989120000000')
+        self.client.force_authenticate(self.user)
+        self.phone = Product.objects.create(title='Phone', stock=5)
+        self.case = Product.objects.create(title='Case', stock=1)
+
+    def _reserve(self, *items):
+        return self.client.post(
+            reverse('reservation_create'),
+            {'items': [{'product': product.pk, 'quantity': quantity} for product, quantity in items]},
+            format='json',
+        )
+
+    def _stock(self, product):
+        product.refresh_from_db()
+        return product.stock
+
+    def test_reserve_and_release(self):
+        response = self._reserve((self.phone, 2), (self.case, 1), (self.phone, 1))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], 'active')
+        self.assertEqual((self._stock(self.phone), self._stock(self.case)), (2, 0))
+
+        url = reverse('reservation_detail', args=[response.data['id']])
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual((self._stock(self.phone), self._stock(self.case)), (5, 1))
+        self.assertEqual(self.client.get(url).data['status'], 'released')
+
+    def test_cart_is_all_or_nothing(self):
+        response = self._reserve((self.phone, 2), (self.case, 2))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['product'], self.case.pk)
+        self.assertEqual((self._stock(self.phone), self._stock(self.case)), (5, 1))
+        self.assertFalse(Reservation.objects.exists())
+        self.assertEqual(self._reserve((self.phone, 0)).status_code, 400)
+
+    @override_settings(RESERVATION_TTL=0)
+    def test_expiry_releases_stock(self):
+        response = self._reserve((self.phone, 5))
+        self.assertEqual(self._stock(self.phone), 0)
+        self.assertEqual(run_jobs(claim(10)), 0)
+        self.assertEqual(self._stock(self.phone), 5)
+        self.assertEqual(Reservation.objects.get(pk=response.data['id']).status, Reservation.EXPIRED)
+
+        Reservation.objects.create(expires_at=timezone.now())
+        call_command('release_expired_reservations', stdout=StringIO())
+        self.assertFalse(Reservation.objects.filter(status=Reservation.ACTIVE).exists())
+
+    def test_only_own_reservations(self):
+        reservation = reserve([(self.phone.pk, 1)])
+        self.assertEqual(self.client.get(reverse('reservation_detail', args=[reservation.pk])).status_code, 404)
+
+
+class ReservationConcurrencyTest(TransactionTestCase):
+    """Many threads reserving one hot product never take more than its stock."""
+
+    def test_hot_product_is_not_oversold(self):
+        product = Product.objects.create(title='Hot', stock=50)
+
+        def buyer(attempts):
+            reserved = 0
+            try:
+                for _ in range(attempts):
+                    try:
+                        reserve([(product.pk, 1)])
+                        reserved += 1
+                    except OutOfStock:
+                        pass
+            finally:
+                connection.close()
+            return reserved
+
+        with ThreadPoolExecutor(8) as pool:
+            reserved = sum(pool.map(buyer, [10] * 8))
+
+        product.refresh_from_db()
+        self.assertEqual(reserved, 50)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(ReservationItem.objects.count(), 50)
+
+
+
+class ProductVariantTest(TestCase):
+    def setUp(self):
+        self.color = OptionGroup.objects.create(title='Color')
+        self.size = OptionGroup.objects.create(title='Size')
+        self.red, self.blue, self.green = (
+            OptionValue.objects.create(option_group=self.color, value=value) for value in ('Red', 'Blue', 'Green')
+        )
+        self.small, self.large = (OptionValue.objects.create(option_group=self.size, value=value) for value in 'SL')
+        self.shirt = Product.objects.create(title='Shirt')
+        for group in (self.color, self.size):
+            ProductOptionGroup.objects.create(product=self.shirt, option_group=group)
+        for value in (self.red, self.blue):
+            ProductAttributeValue.objects.create(product=self.shirt, option_value=value)
+
+    def _keys(self, product):
+        return set(product.variants.filter(is_active=True).values_list('combination_key', flat=True))
+
+    def test_cartesian_product_of_option_groups(self):
+        self.assertEqual(sync_variants([self.shirt.pk]), (4, 0, 0))
+        # The shirt only comes in its own colors, but in every size.
+        self.assertEqual(self._keys(self.shirt), {
+            ProductVariant.make_combination_key([color.pk, size.pk])
+            for color in (self.red, self.blue) for size in (self.small, self.large)
+        })
+        variant = ProductVariant.lookup(self.shirt.pk, [self.large.pk, self.red.pk])
+        self.assertEqual(set(variant.option_values.all()), {self.red, self.large})
+        self.assertEqual(variant, ProductVariant.lookup(self.shirt.pk, [str(self.red.pk), str(self.large.pk)]))
+        self.assertIsNone(ProductVariant.lookup(self.shirt.pk, [self.green.pk, self.large.pk]))
+        self.assertEqual(sync_variants([self.shirt.pk]), (0, 0, 0))
+
+    def test_incremental_sync_keeps_stock(self):
+        sync_variants([self.shirt.pk])
+        red_small = ProductVariant.lookup(self.shirt.pk, [self.red.pk, self.small.pk])
+        red_small.stock = 7
+        red_small.save()
+
+        ProductAttributeValue.objects.filter(product=self.shirt, option_value=self.red).delete()
+        self.assertEqual(sync_variants([self.shirt.pk]), (0, 0, 2))
+        self.assertEqual(len(self._keys(self.shirt)), 2)
+
+        ProductAttributeValue.objects.create(product=self.shirt, option_value=self.red)
+        ProductAttributeValue.objects.create(product=self.shirt, option_value=self.green)
+        self.assertEqual(sync_variants([self.shirt.pk]), (2, 2, 0))
+        self.assertEqual(ProductVariant.lookup(self.shirt.pk, [self.small.pk, self.red.pk]).stock, 7)
+
+    def test_over_limit_product_keeps_its_variants(self):
+        sync_variants([self.shirt.pk])
+        ProductAttributeValue.objects.create(product=self.shirt, option_value=self.green)
+        with patch('product.variants.MAX_VARIANTS_PER_PRODUCT', 4), self.assertLogs('product.variants', 'WARNING'):
+            self.assertEqual(sync_variants([self.shirt.pk]), (0, 0, 0))
+        self.assertEqual(len(self._keys(self.shirt)), 4)
+
+    def test_query_count_does_not_grow_with_products(self):
+        products = [Product.objects.create(title=f'Shirt {i}') for i in range(20)]
+        ProductOptionGroup.objects.bulk_create(
+            ProductOptionGroup(product=product, option_group=group)
+            for product in products for group in (self.color, self.size)
+        )
+        with self.assertNumQueries(8):
+            created, _, _ = sync_variants([product.pk for product in products] + [self.shirt.pk])
+        self.assertEqual(created, 20 * 6 + 4)
+
+    def test_option_changes_queue_a_sync(self):
+        self.assertEqual(run_jobs(claim(100)), 0)
+        self.assertEqual(self.shirt.variants.count(), 4)
+        OptionValue.objects.create(option_group=self.size, value='XL')
+        ProductAttributeValue.objects.create(product=self.shirt, option_value=self.green)
+        self.assertEqual(run_jobs(claim(100)), 0)
+        self.assertEqual(self.shirt.variants.count(), 9)
+
+    def test_variants_endpoint(self):
+        sync_variants([self.shirt.pk])
+        url = reverse('product_variants', args=[self.shirt.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 4)
+
+        response = self.client.get(url, {'options': f'{self.large.pk},{self.blue.pk}'})
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(sorted(response.data[0]['option_values']), sorted([self.blue.pk, self.large.pk]))
+        self.assertEqual(self.client.get(url, {'options': 'red'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('product_variants', args=[0])).status_code, 404)
+
+
+class OpenAPISchemaTest(TestCase):
+    """The documentation views serve the prebuilt schema instead of generating it per request."""
+
+    def setUp(self):
+        schema_root = tempfile.TemporaryDirectory()
+        self.addCleanup(schema_root.cleanup)
+        self.root = schema_root.name
+        self.enterContext(self.settings(SCHEMA_ROOT=self.root))
+        schema_cache.clear()
+        self.addCleanup(schema_cache.clear)
+        self.url = reverse('schema-json', args=['.json'])
+
+    def test_serves_built_schema_with_etag(self):
+        call_command('build_openapi_schema', stdout=StringIO())
+        with open(os.path.join(self.root, 'openapi.json'), 'rb') as stream:
+            built = stream.read()
+        self.assertIn('/product/{id}/variants/', json.loads(built)['paths'])
+
+        with patch('config.schema.generate_documents') as generate:
+            response = self.client.get(self.url)
+            self.assertEqual(response.content, built)
+            self.assertEqual(self.client.get(reverse('schema-swagger-ui'), {'format': 'openapi'}).content, built)
+            self.assertIn(b'swagger:', self.client.get(reverse('schema-json', args=['.yaml'])).content)
+        generate.assert_not_called()
+
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_stale_build_is_regenerated_once(self):
+        build_schema()
+        with patch.object(ProductVariantSerializer.Meta, 'fields', ('id', 'sku', 'option_values')):
+            with self.assertLogs('config.schema', 'WARNING'):
+                response = self.client.get(self.url)
+            with patch('config.schema.api_fingerprint') as fingerprint:
+                self.client.get(self.url)
+            fingerprint.assert_not_called()
+        variant = response.json()['definitions']['ProductVariant']
+        self.assertEqual(set(variant['properties']), {'id', 'sku', 'option_values'})
+
+    def test_fingerprint_follows_serializer_fields(self):
+        fingerprint = api_fingerprint()
+        self.assertEqual(api_fingerprint(), fingerprint)
+        with patch.object(ProductVariantSerializer.Meta, 'fields', ('id', 'sku', 'option_values')):
+            self.assertNotEqual(api_fingerprint(), fingerprint)
+
+
+class ReadReplicaRoutingTest(TransactionTestCase):
+    """Safe catalog requests read from a replica, here a separate SQLite file, until the client writes."""
+
+    def setUp(self):
+        replica_root = tempfile.TemporaryDirectory()
+        self.addCleanup(replica_root.cleanup)
+        # Registered on this thread only, like a connection created on the fly.
+        primary = connections['default']
+        connections['test_replica'] = type(primary)(
+            {**primary.settings_dict, 'NAME': os.path.join(replica_root.name, 'replica.sqlite3')}, 'test_replica'
+        )
+        self.addCleanup(connections.__delitem__, 'test_replica')
+        self.addCleanup(lambda: connections['test_replica'].close())
+        self.enterContext(self.settings(READ_REPLICAS=['test_replica']))
+
+        User = get_user_model()
+        self.client.force_login(User.objects.create_user(
+            username='buyer', password='secret', phone_number='+989120000000'
+        ))
+        self.old = Product.objects.create(title='Old', stock=5)
+        refresh_replicas()
+        self.new = Product.objects.create(title='New', stock=5)
+
+    def _get_new(self):
+        return self.client.get(reverse('product_detail', args=[self.new.pk]))
+
+    def test_reads_follow_the_client_writes(self):
+        # The replica has not caught up with the new product yet.
+        self.assertEqual(self._get_new().status_code, 404)
+
+        response = self.client.post(
+            reverse('reservation_create'), {'items': [{'product': self.old.pk, 'quantity': 1}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self._get_new().status_code, 200)
+
+        self.client.cookies.pop(PIN_COOKIE)
+        self.assertEqual(self._get_new().status_code, 404)
+        refresh_replicas()
+        self.assertEqual(self._get_new().status_code, 200)
+
+    def test_transactions_and_non_request_reads_use_the_primary(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Product))
+        self.assertTrue(Product.objects.filter(pk=self.new.pk).exists())
+        self.assertFalse(router.allow_migrate('test_replica', 'product'))
+        with transaction.atomic():
+            self.assertIsNone(router.db_for_read(Product))
+
+    async def test_async_middleware(self):
+        router = ReplicaRouter()
+        routed = []
+
+        async def get_response(request):
+            await middleware.process_view(request, ProductDetailView.as_view(), (), {})
+            routed.append(router.db_for_read(Product))
+            if request.method == 'POST':
+                router.db_for_write(Product)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        factory = RequestFactory()
+        response = await middleware(factory.get('/'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        response = await middleware(factory.post('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(routed, ['test_replica', None])
+
+
+class AsyncMiddlewareTest(SimpleTestCase):
+    def test_asgi_chain_needs_no_thread_adapters(self):
+        """Under ASGI the project middleware run as coroutines, with no sync_to_async around them."""
+        switches = []
+        adapt_method_mode = BaseHandler.adapt_method_mode
+
+        def record(handler, is_async, method, method_is_async=None, **kwargs):
+            if method_is_async is None:
+                method_is_async = iscoroutinefunction(method)
+            name = kwargs.get('name') or type(getattr(method, '__self__', method)).__module__
+            if is_async != method_is_async and 'config.' in name:
+                switches.append(name)
+            return adapt_method_mode(handler, is_async, method, method_is_async, **kwargs)
+
+        with patch.object(BaseHandler, 'adapt_method_mode', record):
+            ASGIHandler().load_middleware(is_async=True)
+        self.assertEqual(switches, [])
+
+
+class SQLiteProfileTest(SimpleTestCase):
+    def test_production_profile_pragmas(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        primary = connections['default']
+        database = type(primary)({
+            **primary.settings_dict,
+            'NAME': os.path.join(root.name, 'db.sqlite3'),
+            'OPTIONS': settings.SQLITE_PROFILES['production'],
+        }, 'profile_test')
+        self.addCleanup(database.close)
+        with database.cursor() as cursor:
+            pragmas = {
+                name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                for name in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store')
+            }
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000, 'temp_store': 2})
+        self.assertEqual(database.transaction_mode, 'IMMEDIATE')
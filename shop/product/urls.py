@@ -1,19 +1,36 @@
 from django.urls import path, include
 
+from . import async_views
 from .routers import api_router
 from .views import (
     ProductListView,
+    ProductSearchView,
+    ProductRepriceView,
+    ProductExportView,
     ProductImageView,
     ProductImageDetailView,
-    ProductDetailView
+    ProductDetailView,
+    ProductVariantListView,
+    ReservationCreateView,
+    ReservationDetailView,
 )
 
 urlpatterns = [
     path('', include(api_router)),
     path('product/', ProductListView.as_view(), name='product_list'),
+    path('product/search/', ProductSearchView.as_view(), name='product_search'),
+    path('product/reprice/', ProductRepriceView.as_view(), name='product_reprice'),
+    path('product/export/', ProductExportView.as_view(), name='product_export'),
     path('product-image/', ProductImageView.as_view(), name='product_image'),
     path('product-image/<int:pk>/', ProductImageDetailView.as_view(), name='product_image'),
     path('product/<int:pk>',ProductDetailView.as_view(), name='product_detail'),
+    path('product/<int:pk>/variants/', ProductVariantListView.as_view(), name='product_variants'),
+    path('reservation/', ReservationCreateView.as_view(), name='reservation_create'),
+    path('reservation/<int:pk>/', ReservationDetailView.as_view(), name='reservation_detail'),
+
+    path('async/product/', async_views.product_list, name='async_product_list'),
+    path('async/product/<int:pk>', async_views.product_detail, name='async_product_detail'),
+    path('async/category/', async_views.category_list, name='async_category_list'),
 
 
 ]
\ No newline at end of file
@@ -0,0 +1,130 @@
+import itertools
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .importer import chunked
+from .models import OptionValue, ProductAttributeValue, ProductOptionGroup, ProductVariant
+
+
+logger = logging.getLogger(__name__)
+
+# Products whose options multiply out to more variants than this are skipped,
+# keeping their existing variants as they are.
+MAX_VARIANTS_PER_PRODUCT = 1000
+
+
+def variant_axes(product_ids):
+    """
+    Return {product_id: [option value ids of each option group]} for `product_ids`.
+
+    A product varies along every active option group linked to it through
+    ProductOptionGroup. Along each group it takes the active values it
+    carries as ProductAttributeValue, or every active value of the group
+    when it carries none. Groups without active values are ignored.
+    """
+    groups = {}
+    linked = ProductOptionGroup.objects.filter(
+        product_id__in=product_ids, option_group__is_active=True
+    ).values_list('product_id', 'option_group_id')
+    for product_id, group_id in linked:
+        groups.setdefault(product_id, set()).add(group_id)
+    if not groups:
+        return {}
+    group_ids = set().union(*groups.values())
+
+    chosen = {}
+    attribute_values = ProductAttributeValue.objects.filter(
+        product_id__in=groups, option_value__option_group_id__in=group_ids, option_value__is_active=True
+    ).values_list('product_id', 'option_value__option_group_id', 'option_value_id')
+    for product_id, group_id, value_id in attribute_values:
+        chosen.setdefault((product_id, group_id), set()).add(value_id)
+
+    group_values = {}
+    for group_id, value_id in (OptionValue.objects.filter(option_group_id__in=group_ids, is_active=True)
+                               .values_list('option_group_id', 'id')):
+        group_values.setdefault(group_id, set()).add(value_id)
+
+    axes = {}
+    for product_id, product_groups in groups.items():
+        product_axes = [
+            sorted(chosen.get((product_id, group_id)) or group_values.get(group_id, ()))
+            for group_id in sorted(product_groups)
+        ]
+        axes[product_id] = [axis for axis in product_axes if axis]
+    return axes
+
+
+def _sync_chunk(product_ids, batch_size):
+    axes = variant_axes(product_ids)
+    desired = {}
+    skipped = set()
+    for product_id, product_axes in axes.items():
+        if not product_axes:
+            continue
+        count = 1
+        for axis in product_axes:
+            count *= len(axis)
+        if count > MAX_VARIANTS_PER_PRODUCT:
+            logger.warning('Product %s has %d option combinations; not generating variants', product_id, count)
+            skipped.add(product_id)
+            continue
+        for combination in itertools.product(*product_axes):
+            desired[(product_id, ProductVariant.make_combination_key(combination))] = combination
+
+    existing = {
+        (product_id, key): (pk, is_active)
+        for product_id, key, pk, is_active in ProductVariant.objects.filter(product_id__in=product_ids)
+        .exclude(product_id__in=skipped).values_list('product_id', 'combination_key', 'pk', 'is_active')
+    }
+    created = ProductVariant.objects.bulk_create(
+        [
+            ProductVariant(product_id=product_id, combination_key=key, sku=f'{product_id}-{key}')
+            for product_id, key in desired
+            if (product_id, key) not in existing
+        ],
+        batch_size=batch_size,
+    )
+    Through = ProductVariant.option_values.through
+    Through.objects.bulk_create(
+        (
+            Through(productvariant_id=variant.pk, optionvalue_id=value_id)
+            for variant in created
+            for value_id in desired[(variant.product_id, variant.combination_key)]
+        ),
+        batch_size=batch_size,
+    )
+
+    now = timezone.now()
+    reactivate = [pk for key, (pk, is_active) in existing.items() if key in desired and not is_active]
+    deactivate = [pk for key, (pk, is_active) in existing.items() if key not in desired and is_active]
+    ProductVariant.objects.filter(pk__in=reactivate).update(is_active=True, updated_at=now)
+    ProductVariant.objects.filter(pk__in=deactivate).update(is_active=False, updated_at=now)
+    return len(created), len(reactivate), len(deactivate)
+
+
+def sync_variants(product_ids, batch_size=500):
+    """
+    Bring the variants of `product_ids` in line with their current options.
+
+    Works on `batch_size` products at a time with a fixed number of queries
+    per batch: missing combinations are bulk-created with their option
+    values, combinations no longer offered are deactivated and returning
+    ones reactivated, so stock and price deltas survive option changes.
+    Untouched variants are not written. Returns (created, reactivated,
+    deactivated) counts.
+    """
+    totals = [0, 0, 0]
+    for chunk in chunked(sorted(set(product_ids)), batch_size):
+        with transaction.atomic():
+            for index, count in enumerate(_sync_chunk(chunk, batch_size)):
+                totals[index] += count
+    return tuple(totals)
+
+
+def sync_all_variants(batch_size=500):
+    """sync_variants() for every product that has or had option groups."""
+    product_ids = set(ProductOptionGroup.objects.values_list('product_id', flat=True))
+    product_ids.update(ProductVariant.objects.values_list('product_id', flat=True))
+    return sync_variants(product_ids, batch_size)
@@ -1,14 +1,40 @@
-from rest_framework import ApiView
+import hashlib
+
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.generics import ListAPIView, CreateAPIView, RetrieveAPIView
-from rest_framework.permissions import SAFE_METHODS
+from rest_framework.generics import (ListAPIView, CreateAPIView, RetrieveAPIView, RetrieveDestroyAPIView,
+                                     GenericAPIView)
+from rest_framework.permissions import SAFE_METHODS, IsAdminUser, IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.utils.urls import replace_query_param
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
+from django.utils.http import http_date
 
-from .models import Category, OptionAttribute, Product, ProductImage, OptionGroup
+from .models import (CATEGORY_TREE_CACHE_KEY, CacheVersion, Category, OptionAttribute, Product, ProductImage,
+                     ProductVariant, Reservation, OptionGroup)
 from .serializer import (CategorySerializer, OptionAttributeSerializer, OptionGroupSerializer, 
                          ProductDetailSerializer,
                          ProductImageSerializer, 
-                         ProductListSerializer)
+                         ProductListSerializer,
+                         ProductRepriceSerializer,
+                         ProductSearchSerializer,
+                         ProductVariantSerializer,
+                         ReservationSerializer)
+from .pagination import ProductCursorPagination
+from .cache import category_tree_cache
+from .facets import facet_index
+from .fast_serializers import product_card_serializer, serialize_product_cards, serialize_product_detail
+from .filters import filter_by_category
+from .pricing import reprice_products
+from .reservations import OutOfStock, release, reserve
+from .search import search_products
 
 
 
@@ -22,27 +48,219 @@ class CategoryViewSet(ModelViewSet):
     - GET /categories/{id}/ - Retrieve specific category
     - PUT/PATCH /categories/{id}/ - Update category
     - DELETE /categories/{id}/ - Delete category
+    - GET /categories/tree/ - Nested tree of active categories
     
-    Uses CategorySerializer for all operations.
+    Uses CategorySerializer for all operations except the tree, which is
+    served pre-rendered from a process-local cache invalidated on every
+    category write.
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        return HttpResponse(category_tree_cache.get(), content_type='application/json')
+
 
 class ProductListView(ListAPIView):
     """
     API endpoint for listing products with basic information.
     
     GET /products/
-    - Returns paginated list of products
+    - Returns paginated list of active products
     - Includes only core fields (id, title, price)
     - Suitable for product listing pages
     
-    Uses ProductListSerializer for optimized response structure.
+    Responses have the ProductListSerializer format but are built by the
+    precompiled fast serializer from `values()` rows. Main images are
+    batch-loaded for the whole page with a single query, so the number of
+    queries does not grow with the page size.
+
+    Filtering:
+    - ?category=<slug> - Products in that category
+    - ?category=<slug>&include_descendants=1 - Products in that category
+      or any category below it, resolved through the materialized path
+    - ?options=<id>,<id> - Products carrying the given option values
+      (AND across option groups, OR within one), resolved from the
+      in-memory facet index instead of SQL joins
+    - ?facets=1 - Adds per-option-value product counts to the response,
+      counted over the active products of the requested category
+
+    Pagination:
+    - Default is limit/offset (?limit=&offset=)
+    - ?pagination=cursor (or any ?cursor=) switches to keyset pagination,
+      which keeps deep pages as cheap as the first one
     """
-    queryset = Product.objects.all()
+    queryset = Product.objects.prefetch_related(
+        Prefetch(
+            'product_images',
+            queryset=ProductImage.objects.filter(index=0),
+            to_attr='main_images',
+        )
+    )
     serializer_class = ProductListSerializer
 
+    def get_option_value_ids(self):
+        options = self.request.query_params.get('options', '')
+        return [int(pk) for pk in options.split(',') if pk.strip().isdigit()]
+
+    def get_listed_queryset(self):
+        """The listed products before the option filter: the active ones, in the requested category."""
+        queryset = super().get_queryset().filter(is_active=True)
+        slug = self.request.query_params.get('category')
+        if not slug:
+            return queryset
+        include_descendants = self.request.query_params.get('include_descendants') in ('1', 'true')
+        return filter_by_category(queryset, slug, include_descendants)
+
+    def get_queryset(self):
+        queryset = self.get_listed_queryset()
+        option_value_ids = self.get_option_value_ids()
+        if option_value_ids:
+            queryset = facet_index.filter(queryset, option_value_ids)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        # (created_at, id) is the cursor pagination position.
+        rows = queryset.values(*product_card_serializer.columns, 'created_at')
+        page = self.paginate_queryset(rows)
+        if page is None:
+            response = Response(serialize_product_cards(rows))
+        else:
+            response = self.get_paginated_response(serialize_product_cards(page))
+        if request.query_params.get('facets') in ('1', 'true'):
+            # Counted over the same products the list is drawn from.
+            listed = self.get_listed_queryset().prefetch_related(None).values_list('pk', flat=True)
+            response.data['facets'] = facet_index.counts(self.get_option_value_ids(), listed)
+        return response
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = ProductCursorPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
+
+class ProductSearchView(ListAPIView):
+    """
+    API endpoint for full-text product search.
+    
+    GET /product/search/?q=<text>
+    - Matches words (and word prefixes) in title and description
+    - Results are ranked by bm25, title matches weigh more
+    - Each result carries a highlighted title and description snippet
+    - Paginated with ?limit=&offset=, without a COUNT(*) query
+    
+    Backed by the SQLite FTS5 table product_product_fts, kept in sync with
+    product writes by triggers.
+    """
+    queryset = ProductListView.queryset
+    serializer_class = ProductSearchSerializer
+    default_limit = 30
+    max_limit = 100
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        return max(1, min(limit, self.max_limit))
+
+    def get_offset(self):
+        try:
+            return max(0, int(self.request.query_params.get('offset', 0)))
+        except ValueError:
+            return 0
+
+    def list(self, request, *args, **kwargs):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'This query parameter is required.'})
+        limit, offset = self.get_limit(), self.get_offset()
+        # Fetch one extra hit to know whether there is a next page.
+        hits = search_products(text, limit + 1, offset)
+        has_next = len(hits) > limit
+        hits = hits[:limit]
+
+        products = self.get_queryset().in_bulk([hit['id'] for hit in hits])
+        results = []
+        for hit in hits:
+            product = products.get(hit['id'])
+            if product is None:
+                continue
+            product.rank = hit['rank']
+            product.title_highlight = hit['title_highlight']
+            product.snippet = hit['snippet']
+            results.append(product)
+
+        next_url = None
+        if has_next:
+            next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
+        return Response({
+            'next': next_url,
+            'results': self.get_serializer(results, many=True).data,
+        })
+
+
+class ProductRepriceView(GenericAPIView):
+    """
+    API endpoint for bulk price and discount changes.
+    
+    POST /product/reprice/
+    - Selects products by `ids` and/or `category` (+ `include_descendants`)
+    - Sets `price_discount` and/or scales the price by `price_change_percent`
+    - Recomputes `final_price_value` in SQL, one UPDATE per batch
+    - Returns the number of updated products
+    
+    Restricted to staff users.
+    """
+    serializer_class = ProductRepriceSerializer
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = reprice_products(
+            serializer.get_products(),
+            price_discount=serializer.validated_data.get('price_discount'),
+            price_change_percent=serializer.validated_data.get('price_change_percent'),
+        )
+        return Response({'updated': updated})
+
+
+class ProductExportView(GenericAPIView):
+    """
+    API endpoint streaming the whole active catalog as NDJSON.
+    
+    GET /product/export/
+    - One JSON object per line, in the ProductDetailSerializer format
+    - Products are read in primary-key order with a chunked iterator;
+      images and categories are prefetched once per chunk
+    - The response is streamed, so memory stays bounded and the first
+      line is sent as soon as the first chunk is read
+    
+    Requires an authenticated user.
+    """
+    queryset = Product.objects.filter(is_active=True).prefetch_related('product_images', 'category').order_by('pk')
+    serializer_class = ProductDetailSerializer
+    permission_classes = [IsAuthenticated]
+    chunk_size = 500
+
+    def stream(self):
+        renderer = JSONRenderer()
+        for product in self.get_queryset().iterator(chunk_size=self.chunk_size):
+            yield renderer.render(self.get_serializer(product).data) + b'\n'
+
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(self.stream(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="products.ndjson"'
+        return response
+
 
 class ProductImageView(CreateAPIView):
     """
@@ -91,10 +309,150 @@ class ProductDetailView(RetrieveAPIView):
       - Pricing details
       - Inventory status
     
-    Uses ProductDetailSerializer with depth=1 for related objects.
+    Uses the ProductDetailSerializer format, built from `values()` rows by
+    the precompiled fast serializer.
+
+    Responses carry an ETag and Last-Modified derived from the product's
+    `updated_at` (touched whenever its images or category links change)
+    and the category tree version, and conditional requests get a 304.
+    The body is rendered by the negotiated renderer and cached under the
+    ETag and media type, so a change to any of those inputs invalidates
+    it; the browsable API is rendered on every request.
     """
-    queryset = Product.objects.all()
+    queryset = Product.objects.prefetch_related('product_images', 'category')
     serializer_class = ProductDetailSerializer
+    cache_timeout = 60 * 15
+
+    def get_validators(self):
+        """
+        Return (etag, last_modified) for the requested product from two cheap queries.
+
+        The ETag is strong, so it also names the representation: the
+        negotiated media type with its parameters (e.g. `indent=`) and the
+        host the absolute image URLs point to.
+        """
+        updated_at = Product.objects.filter(pk=self.kwargs['pk']).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            raise Http404
+        category_version, categories_updated_at = CacheVersion.state(CATEGORY_TREE_CACHE_KEY)
+        last_modified = max(filter(None, (updated_at, categories_updated_at)))
+        representation = f"{self.request.accepted_media_type} {self.request.build_absolute_uri('/')}"
+        variant = hashlib.sha256(representation.encode()).hexdigest()[:12]
+        etag = quote_etag(f"{self.kwargs['pk']}-{updated_at.timestamp()}-{category_version}-{variant}")
+        return etag, last_modified
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        headers = {'ETag': etag, 'Last-Modified': http_date(last_modified.timestamp())}
+        response = HttpResponse(headers=headers)
+        conditional = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified.timestamp()), response=response
+        )
+        if conditional is not response:
+            patch_vary_headers(conditional, ['Accept'])
+            return conditional
+
+        renderer = request.accepted_renderer
+        if isinstance(renderer, BrowsableAPIRenderer):
+            response = Response(self.get_detail_data(), headers=headers)
+        else:
+            # Rendered with the negotiated renderer and cached under the ETag, which
+            # names the media type and host of this representation.
+            media_type = request.accepted_media_type
+            cache_key = f'product_detail:{etag}'
+            content = cache.get(cache_key)
+            if content is None:
+                content = renderer.render(self.get_detail_data(), media_type, self.get_renderer_context())
+                cache.set(cache_key, content, self.cache_timeout)
+            content_type = f'{media_type}; charset={renderer.charset}' if renderer.charset else media_type
+            response = HttpResponse(content, content_type=content_type, headers=headers)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    def get_detail_data(self):
+        data = serialize_product_detail(self.kwargs['pk'], self.request)
+        if data is None:
+            raise Http404
+        return data
+
+
+class ProductVariantListView(ListAPIView):
+    """
+    API endpoint for the purchasable variants of a product.
+    
+    GET /product/{id}/variants/
+    - Lists the active variants with their option values, stock and price delta
+    - ?options=3,7 returns only the variant with exactly these option
+      values, in any order, through the indexed combination key
+    
+    Returns 404 for unknown or inactive products.
+    """
+    serializer_class = ProductVariantSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return ProductVariant.objects.none()
+        if not Product.objects.filter(pk=self.kwargs['pk'], is_active=True).exists():
+            raise Http404
+        queryset = ProductVariant.objects.filter(product_id=self.kwargs['pk'], is_active=True)
+        options = self.request.query_params.get('options')
+        if options is not None:
+            try:
+                key = ProductVariant.make_combination_key(options.split(','))
+            except ValueError:
+                raise ValidationError({'options': 'Expected comma-separated option value ids.'})
+            queryset = queryset.filter(combination_key=key)
+        return queryset.order_by('combination_key')
+
+
+class ReservationCreateView(CreateAPIView):
+    """
+    API endpoint for reserving stock.
+    
+    POST /reservation/
+    - Body: {"items": [{"product": <id>, "quantity": <n>}, ...]}
+    - Takes the stock of every item in one transaction with conditional
+      updates, so concurrent carts never oversell
+    - Returns the reservation with its expiry (201), or 409 naming the
+      first product that cannot cover its quantity; then nothing is reserved
+    
+    Reservations are released automatically once they expire.
+    Requires an authenticated user.
+    """
+    serializer_class = ReservationSerializer
+    permission_classes = [IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = [(item['product_id'], item['quantity']) for item in serializer.validated_data['items']]
+        try:
+            reservation = reserve(items, user=request.user)
+        except OutOfStock as exc:
+            return Response({'detail': str(exc), 'product': exc.product_id}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(reservation).data, status=status.HTTP_201_CREATED)
+
+
+class ReservationDetailView(RetrieveDestroyAPIView):
+    """
+    API endpoint for one of the user's reservations.
+    
+    GET /reservation/{id}/ - Reservation status, expiry and items
+    DELETE /reservation/{id}/ - Release it, putting its stock back
+    
+    Requires an authenticated user; only their own reservations are visible.
+    """
+    serializer_class = ReservationSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Reservation.objects.none()
+        return self.request.user.reservations.prefetch_related('items')
+
+    def perform_destroy(self, instance):
+        release(instance.pk)
 
 
 class OptionGroupViewSet(ModelViewSet):